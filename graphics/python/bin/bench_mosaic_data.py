@@ -0,0 +1,121 @@
+#!/usr/local/bin/python3
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+"""
+This script benchmarks the mosaic data generators against their original
+(list comprehension / nested loop) implementations, and checks that both agree
+"""
+
+# trick for making local package imports work
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), ".."))
+
+from mosaic import DATA_MODES
+
+
+## original implementations ##
+
+def legacy_squared(n):
+    return np.array([i**2 for i in range(n*n)]).reshape((n,n))
+
+def legacy_sin(n):
+    return np.array([np.sin(i) for i in range(n*n)]).reshape((n,n))
+
+def legacy_sin_2(n):
+    return np.array([np.sin(i/2) for i in range(n*n)]).reshape((n,n))
+
+def legacy_sin_3(n):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.array([np.sin(i)/i for i in range(n*n)]).reshape((n,n))
+
+def legacy_sin_4(n):
+    return np.array([np.sin(i)/20 for i in range(n*n)]).reshape((n,n))
+
+def legacy_square_spiral(n, bug=False):
+    data = [[0 for i in range(n)] for j in range(n)]
+    cur_val = 0
+
+    for k in range(n//2):
+        i = k
+        for j in range(k, n - k):
+            data[i][j] = cur_val
+            cur_val += 1
+        for i in range(k + 1, n - 1 - k):
+            data[i][j] = cur_val
+            cur_val += 1
+        i += 1
+        for j in range(n - 1 - k, k - 1, -1):
+            data[i][j] = cur_val
+            cur_val += 1
+        for i in range(n - 2 - k, k, -1):
+            data[i][j] = cur_val
+            cur_val += 1
+
+    if n % 2 == 1:
+        if not bug:
+            j += 1
+            data[i][j] = cur_val
+        else:
+            data[2 * k + 1][2 * k + 1] = cur_val
+
+    return np.array(data)
+
+def legacy_comprehensive_random(n):
+    data = list(range(n*n))
+    random.shuffle(data)
+    return np.array(data).reshape((n,n))
+
+LEGACY_MODES = {
+    "squared":                  legacy_squared,
+    "sin":                      legacy_sin,
+    "sin2":                     legacy_sin_2,
+    "sin3":                     legacy_sin_3,
+    "sin4":                     legacy_sin_4,
+    "square-spiral":            legacy_square_spiral,
+    "comprehensive-random":     legacy_comprehensive_random,
+}
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def bench(modes, sizes, legacy_max_n, dtype):
+    print("%-22s %7s %12s %12s %9s  %s" % ("mode", "n", "legacy (s)", "numpy (s)", "speedup", "match"))
+    for mode in modes:
+        for n in sizes:
+            new, new_time = timed(DATA_MODES[mode], n, dtype=dtype)
+
+            legacy_time = match = None
+            if mode in LEGACY_MODES and n <= legacy_max_n:
+                old, legacy_time = timed(LEGACY_MODES[mode], n)
+                if mode == "comprehensive-random":
+                    match = np.array_equal(np.sort(old, axis=None), np.sort(new, axis=None))
+                else:
+                    match = np.allclose(old, new, equal_nan=True)
+
+            print("%-22s %7d %12s %12.4f %9s  %s" % (mode, n,
+                "-" if legacy_time is None else "%.4f" % legacy_time,
+                new_time,
+                "-" if legacy_time is None else "%.1fx" % (legacy_time / max(new_time, 1e-9)),
+                "-" if match is None else match))
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark mosaic data generators (original vs numpy)")
+    parser.add_argument("--modes", "-m", nargs="+", choices=DATA_MODES.keys(), default=list(DATA_MODES.keys()), help="modes to benchmark")
+    parser.add_argument("--sizes", "-n", nargs="+", type=int, default=[100, 1000, 3000, 10000], help="matrix sizes (n x n)")
+    parser.add_argument("--legacy-max-n", "-l", type=int, default=3000, help="skip the (slow) original implementations above this n")
+    parser.add_argument("--dtype", type=str, default=None, help="numpy dtype for the new generators")
+    args = parser.parse_args()
+
+    bench(args.modes, args.sizes, args.legacy_max_n, args.dtype)
+
+if __name__ == "__main__":
+    main()
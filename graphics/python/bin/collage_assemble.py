@@ -1,6 +1,7 @@
 #!/usr/local/bin/python3
 
 import argparse
+import math
 import random
 import os
 import sys
@@ -10,13 +11,20 @@ from PIL import Image
 # trick for making local package imports work
 sys.path.append(os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), ".."))
 
+from common import DECODE_QUALITIES
+from common import THUMBNAIL_CACHE_DIR
+from common import ThumbnailCache
 from common import get_image_files_by_folder
+from common import get_median_image_ratio
+from common import load_thumbnail
+from grid import get_best_dimensions
 
 OUTPUT_SIZE = (3000, 3000)
 MODES = ("random", "start-empty", "end-empty", "grouped")
 
 class PopulationCollage:
-    def __init__(self, cell_images, cols, rows, num_empty_cells=0, empty_cell_image=None, bg_color="white", mode="random"):
+    def __init__(self, cell_images, cols, rows, num_empty_cells=0, empty_cell_image=None, bg_color="white", mode="random",
+            cell_size=None, quality="exact", cache=None):
         self.cell_images = cell_images
 
         self.cols = cols
@@ -29,6 +37,11 @@ class PopulationCollage:
 
         self.mode = mode
 
+        # if set, cell images are decoded straight to this size (see load_thumbnail)
+        self.cell_size = cell_size
+        self.quality = quality
+        self.cache = cache
+
         self.build_collage()
 
     def get_image(self, col, row):
@@ -36,6 +49,8 @@ class PopulationCollage:
         img = self._map[i]
         if img == "empty":
             return self._empty_cell_image
+        elif self.cell_size:
+            return load_thumbnail(self._image_pool[img], self.cell_size, self.quality, cache=self.cache)
         else:
             return self._image_pool[img]
 
@@ -47,6 +62,15 @@ class PopulationCollage:
         self._build_map()
 
     def _build_image_pool(self):
+        if self.cell_size:
+            # images are only decoded when their cell is drawn
+            self._image_pool = list(self.cell_images)
+            if self.empty_cell_image:
+                self._empty_cell_image = load_thumbnail(self.empty_cell_image, self.cell_size, self.quality, cache=self.cache)
+            else:
+                self._empty_cell_image = Image.new('RGB', self.cell_size, self.bg_color)
+            return
+
         self._image_pool = []
         for ci in self.cell_images:
             self._image_pool.append(Image.open(ci))
@@ -83,15 +107,16 @@ class PopulationCollage:
         
 
 
-def collage_assemble(output, image_files, cols, rows, num_empty_cells, empty_cell_image, bg_color, mode):
-    pop_collage = PopulationCollage(image_files, cols, rows, num_empty_cells, empty_cell_image, bg_color, mode)
-
-    out_image = Image.new('RGB', OUTPUT_SIZE)
-
+def collage_assemble(output, image_files, cols, rows, num_empty_cells, empty_cell_image, bg_color, mode, quality="exact", cache=None):
     w, h = OUTPUT_SIZE
     cw = int(w / cols)
     ch = int(h / rows)
 
+    pop_collage = PopulationCollage(image_files, cols, rows, num_empty_cells, empty_cell_image, bg_color, mode,
+            cell_size=(cw, ch), quality=quality, cache=cache)
+
+    out_image = Image.new('RGB', OUTPUT_SIZE)
+
     for r in range(rows):
         for c in range(cols):
             cell = pop_collage.get_image(c, r)
@@ -110,11 +135,15 @@ if __name__ == "__main__":
     parser.add_argument("-o", "--output", required=True, help="output file")
     parser.add_argument("-ei", "--empty-image", dest="empty_image", required=False, help="empty cell image")
 
-    parser.add_argument("-c", "--cols", type=int, required=True, help="number of columns in the photo grid")
-    parser.add_argument("-r", "--rows", type=int, required=True, help="number of rows in the photo grid")
+    parser.add_argument("-c", "--cols", type=int, required=False, help="number of columns in the photo grid (default: by number of images)")
+    parser.add_argument("-r", "--rows", type=int, required=False, help="number of rows in the photo grid (default: by number of images)")
     parser.add_argument("-ne", "--num-empty", dest="num_empty_cells", type=int, required=False, default=0, help="how many empty slots to leave in the photo grid")
     parser.add_argument("-bg", "--background", type=str, required=False, default="white", help="color of background (empty cells)")
     parser.add_argument("-m", "--mode", type=str, required=False, choices=MODES, default="random", help="mode of arranging the photos in the grid")
+    parser.add_argument("-dq", "--decode-quality", dest="quality", type=str, required=False, choices=DECODE_QUALITIES.keys(), default="exact",
+            help="cell decoding quality (exact = full decode, balanced/fast = reduced-resolution decode)")
+    parser.add_argument("-tc", "--thumbnail-cache", type=str, required=False, default=THUMBNAIL_CACHE_DIR, help="folder for caching resized cells between runs")
+    parser.add_argument("-ntc", "--no-thumbnail-cache", dest="use_thumbnail_cache", action="store_false", help="don't cache resized cells")
 
     args = parser.parse_args()
 
@@ -124,5 +153,18 @@ if __name__ == "__main__":
     if args.images:
         image_files += args.images
 
-    collage_assemble(args.output, image_files, args.cols, args.rows, args.num_empty_cells, args.empty_image, args.background, args.mode)
+    # missing grid dimensions are fitted to the images (+ empty cells), spare cells are left empty
+    if not args.cols or not args.rows:
+        ncells = len(image_files) + args.num_empty_cells
+        if args.cols:
+            args.rows = math.ceil(ncells / args.cols)
+        elif args.rows:
+            args.cols = math.ceil(ncells / args.rows)
+        else:
+            args.cols, args.rows = get_best_dimensions(ncells, OUTPUT_SIZE[1] / OUTPUT_SIZE[0], tile_ratio=get_median_image_ratio(image_files))
+        args.num_empty_cells += args.cols * args.rows - ncells
+    print("grid dimensions (c X r) %d x %d" % (args.cols, args.rows))
+
+    cache = ThumbnailCache(args.thumbnail_cache) if args.use_thumbnail_cache else None
+    collage_assemble(args.output, image_files, args.cols, args.rows, args.num_empty_cells, args.empty_image, args.background, args.mode, args.quality, cache)
 
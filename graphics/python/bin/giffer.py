@@ -1,18 +1,32 @@
 #!/usr/bin/env python3
 
 import argparse
+import functools
 import os
 import sys
 
-import cv2
-import imageio.v2 as imageio
 import numpy as np
 from PIL import Image, ImageOps
 
 # trick for making local package imports work
 sys.path.append(os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), ".."))
 
+from common import parallel_map
 from common import parse_size_str
+from gif import ENCODERS
+from gif import BackgroundWriter
+from gif import GIFWriter
+from gif import PaletteGIFWriter
+from gif import get_global_palette
+from stabilize import SHIFT_CACHE_NAME
+from stabilize import ShiftCache
+from stabilize import ShiftEstimator
+from stabilize import get_crop_margin
+from stabilize import stabilize_frame
+
+
+# frames the global palette is computed from
+PALETTE_SAMPLES = 16
 
 
 def load_image(filename):
@@ -22,83 +36,110 @@ def load_image(filename):
     return image.convert("RGB")
 
 
-def stabilize_images(images):
-    """Align all images to the first image using translation only, then crop."""
-    if len(images) < 2:
-        return images
+def load_frame(filename, size=None):
+    """Load image, resized to size (if it isn't that size already)."""
+    image = load_image(filename)
+    if size and image.size != tuple(size):
+        image = image.resize(size)
+    return image
+
+
+def iter_frames(filenames, size=None, workers=None, threads=False):
+    """Decode & resize frames in a pool of workers, yielded in order, only a few at a time are in memory."""
+    return parallel_map(functools.partial(load_frame, size=size), filenames, workers, threads=threads)
 
-    ref_img = np.array(images[0])
-    ref_gray = cv2.cvtColor(ref_img, cv2.COLOR_RGB2GRAY)
-    h, w = ref_img.shape[:2]
 
-    shifts = [(0, 0)]  # First image has no shift
+# per worker shift estimator, see set_reference
+_estimator = None
 
-    # Calculate shifts for each image using phase correlation
-    for img in images[1:]:
-        img_arr = np.array(img)
-        img_gray = cv2.cvtColor(img_arr, cv2.COLOR_RGB2GRAY)
 
-        # Phase correlation to find shift
-        shift, _ = cv2.phaseCorrelate(ref_gray.astype(np.float64), img_gray.astype(np.float64))
-        shifts.append((shift[0], shift[1]))
-        print(".", end="", flush=True)
+def set_reference(reference):
+    global _estimator
+    _estimator = ShiftEstimator(reference)
 
-    # Calculate crop region to keep only the common area
-    max_shift_x = max(abs(s[0]) for s in shifts)
-    max_shift_y = max(abs(s[1]) for s in shifts)
-    crop_margin = int(max(max_shift_x, max_shift_y)) + 5
 
-    # Apply shifts and crop
-    stabilized = []
-    for img, (dx, dy) in zip(images, shifts):
-        img_arr = np.array(img)
+def estimate_frame_shift(filename, size):
+    return _estimator.estimate(load_frame(filename, size))
 
-        # Create translation matrix
-        matrix = np.float32([[1, 0, dx], [0, 1, dy]])
-        shifted = cv2.warpAffine(img_arr, matrix, (w, h))
 
-        # Crop to common area
-        cropped = shifted[crop_margin:h-crop_margin, crop_margin:w-crop_margin]
-        stabilized.append(Image.fromarray(cropped))
+def load_stabilized_frame(item, size, crop_margin):
+    filename, shift = item
+    return Image.fromarray(stabilize_frame(load_frame(filename, size), shift, crop_margin))
 
-    print(f" (crop margin: {crop_margin}px)", end="")
-    return stabilized
 
+def estimate_shifts(filenames, size, workers=None, cache=None, threads=False):
+    """
+    Shift of each frame relative to the first one, cached ones are reused
+    frames are decoded & estimated in a pool of workers (each with its own copy of the reference), in order
+    """
+    shifts = [cache.get(f, size) if cache else None for f in filenames]
+    shifts[0] = (0, 0)  # First image has no shift
+    missing = [i for i, shift in enumerate(shifts) if shift is None]
+    print(f"({len(filenames) - 1 - len(missing)} cached) ", end="", flush=True)
 
-def main(output, input_files, duration=0.1, size=None, stabilize=False):
-    # Load all images first
-    images = []
-    for filename in input_files:
-        if os.path.isfile(filename):
-            images.append(load_image(filename))
+    if missing:
+        reference = np.asarray(load_frame(filenames[0], size))
+        estimated = parallel_map(functools.partial(estimate_frame_shift, size=size), [filenames[i] for i in missing], workers,
+                                 initializer=set_reference, initargs=(reference,), threads=threads)
+        for i, shift in zip(missing, estimated):
+            shifts[i] = shift
+            if cache:
+                cache.put(filenames[i], size, shift)
             print(".", end="", flush=True)
 
-    if not images:
+    if cache:
+        cache.save()
+    return shifts
+
+
+def iter_stabilized_frames(filenames, shifts, size, crop_margin, workers=None, threads=False):
+    """Decode, shift & crop frames in a pool of workers, yielded in order."""
+    return parallel_map(functools.partial(load_stabilized_frame, size=size, crop_margin=crop_margin), zip(filenames, shifts), workers,
+                        threads=threads)
+
+
+def main(output, input_files, duration=0.1, size=None, stabilize=False, workers=None, queue_size=4, cache_shifts=True,
+         threads=False, encoder="adaptive"):
+    filenames = [f for f in input_files if os.path.isfile(f)]
+    if not filenames:
         print("No valid images found")
         return
 
-    print(f" loaded {len(images)} images")
+    print(f"{len(filenames)} images")
 
     # Determine size from first image if not specified
     if size is None:
-        size = images[0].size
-
-    # Resize all images
-    images = [img.resize(size) for img in images]
+        size = load_image(filenames[0]).size
 
     # Stabilize if requested
     if stabilize:
+        # two passes over the frames: shifts first (needed for the crop margin), then shift & crop on the way out
         print("Stabilizing: ", end="", flush=True)
-        images = stabilize_images(images)
-        print(" done")
+        cache = ShiftCache(filenames[0]) if cache_shifts else None
+        shifts = estimate_shifts(filenames, size, workers, cache, threads)
+        crop_margin = get_crop_margin(shifts)
+        print(f" done (crop margin: {crop_margin}px)")
+
+        frames = iter_stabilized_frames(filenames, shifts, size, crop_margin, workers, threads)
+    else:
+        frames = iter_frames(filenames, size, workers, threads)
 
-    # Write GIF
-    print("Writing GIF: ", end="", flush=True)
     duration_ms = int(duration * 1000)  # Convert seconds to milliseconds
-    with imageio.get_writer(output, mode='I', duration=duration_ms, loop=0) as writer:
-        for image in images:
-            writer.append_data(np.array(image))
-            print(".", end="", flush=True)
+    if encoder == "global":
+        # one palette for all frames, from a few frames spread over the sequence
+        print("Computing palette: ", end="", flush=True)
+        samples = filenames[::max(1, len(filenames) // PALETTE_SAMPLES)]
+        palette = get_global_palette(iter_frames(samples, size, workers, threads))
+        print(f"{len(palette)} colors")
+        gif_writer = PaletteGIFWriter(output, palette, duration_ms, loop=0)
+    else:
+        gif_writer = GIFWriter(output, duration_ms, loop=0)
+
+    # Write GIF, frames are encoded in the background as they arrive
+    print("Writing GIF: ", end="", flush=True)
+    with BackgroundWriter(gif_writer, queue_size) as writer:
+        for frame in frames:
+            writer.write(frame)
 
     print(" done")
 
@@ -110,6 +151,15 @@ if __name__ == "__main__":
     parser.add_argument("-d", "--duration", type=float, default=0.1, help="Duration per frame in seconds (default: 0.1)")
     parser.add_argument("-s", "--size", type=parse_size_str, default=None, help="Output size as WxH (default: first image size)")
     parser.add_argument("-S", "--stabilize", action="store_true", help="Stabilize images by aligning to first frame")
+    parser.add_argument("-nc", "--no-shift-cache", dest="cache_shifts", action="store_false",
+                        help="Don't reuse / save stabilization shifts (kept in %s next to the first frame)" % SHIFT_CACHE_NAME)
+    parser.add_argument("-w", "--workers", type=int, default=0, help="Number of decoding / stabilizing workers (default: 0 = all cores)")
+    parser.add_argument("-t", "--threads", action="store_true", help="Use threads instead of processes for decoding & stabilizing")
+    parser.add_argument("-e", "--encoder", choices=ENCODERS, default="adaptive",
+                        help="adaptive: a palette per frame, global: one palette for all frames & only changed areas are written"
+                             " (default: adaptive)")
+    parser.add_argument("-q", "--queue-size", type=int, default=4, help="Max frames waiting to be written (default: 4)")
 
     args = parser.parse_args()
-    main(args.output, args.input_files, args.duration, args.size, args.stabilize)
+    main(args.output, args.input_files, args.duration, args.size, args.stabilize, args.workers or None, args.queue_size,
+         args.cache_shifts, args.threads, args.encoder)
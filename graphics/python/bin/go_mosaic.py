@@ -10,13 +10,15 @@ This script creates a mosaic, which is a grid of different colors/shades
 # trick for making local package imports work
 sys.path.append(os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), ".."))
 
+from mosaic import add_tech_spec_name
 from mosaic import get_parser
+from mosaic import get_tech_spec_name
 from mosaic import save_figure
 from mosaic import get_data
 
-def square_mosaic_gradient(mode, output, n, cmap, size, dpi, interpolation, *args, **kwargs):
+def square_mosaic_gradient(mode, output, n, cmap, size, dpi, interpolation, *args, renderer="auto", **kwargs):
     data = get_data(mode, n, *args, **kwargs)
-    save_figure(data, output, cmap, size, dpi, interpolation)
+    save_figure(data, output, cmap, size, dpi, interpolation, renderer)
 
 def square_it_up():
     parser = get_parser()
@@ -26,23 +28,14 @@ def square_it_up():
 
     args = parser.parse_args()
 
-    tech_spec_name = "-".join(filter(None,(
-        args.mode,
-        "%d" % args.n,
-        "%dx%dinch" % args.size,
-        "%ddpi" % args.dpi,
-        args.cmap,
-        args.interpolation,
-        "bug" if args.bug else ""
-    )))
+    tech_spec_name = get_tech_spec_name(args.mode, args.n, args.size, args.dpi, args.cmap, args.interpolation, args.bug)
 
     if args.tsn:
-        filename, ext = os.path.splitext(args.output)
-        args.output = "%s-%s%s" % (filename, tech_spec_name, ext)
+        args.output = add_tech_spec_name(args.output, tech_spec_name)
 
     print(tech_spec_name)
     square_mosaic_gradient(args.mode, args.output, args.n, args.cmap, args.size, args.dpi,
-            args.interpolation, bug=args.bug)
+            args.interpolation, renderer=args.renderer, bug=args.bug, dtype=args.dtype)
 
 if __name__ == "__main__":
     square_it_up()
@@ -0,0 +1,93 @@
+#!/usr/local/bin/python3
+
+import argparse
+import itertools
+import os
+import sys
+import tempfile
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+"""
+This script renders a grid of mosaic variants (modes x sizes x colormaps x ...) in one go
+Each data matrix is computed once, in the main process, and saved to a temporary .npy file
+that the workers memory-map (read only), so it's shared by all the variants rendered from it
+All variants are rendered in a single pool of worker processes, ordered by data matrix
+Outputs are named like go_mosaic.py's --tech-spec-name (<output>-<tech spec name>.<ext>)
+"""
+
+# trick for making local package imports work
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), ".."))
+
+from common import parallel_map
+from mosaic import DTYPES
+from mosaic import INTERPOLATIONS
+from mosaic import RENDERERS
+from mosaic import add_tech_spec_name
+from mosaic import get_data
+from mosaic import get_data_modes
+from mosaic import get_tech_spec_name
+from mosaic import save_figure
+from mosaic import size_str
+
+
+# the data matrix this worker last mapped, and the .npy file it's mapped from
+_data_path = None
+_data = None
+
+def get_variant_data(path):
+    global _data_path, _data
+    if path != _data_path:
+        _data = np.load(path, mmap_mode="r")
+        _data_path = path
+    return _data
+
+def render_variant(variant):
+    data_path, output, cmap, size, dpi, interpolation, renderer = variant
+    save_figure(get_variant_data(data_path), output, cmap, size, dpi, interpolation, renderer)
+    return output
+
+def get_variants(data_folder, output, modes, ns, cmaps, sizes, dpis, interpolations, renderer, bug, dtype):
+    """
+    yields the variants to render, grouped by data matrix
+    each matrix is computed & saved (in data_folder) right before its group, so only as the pool gets to it
+    """
+    for i, (mode, n) in enumerate(itertools.product(modes, ns)):
+        data_path = os.path.join(data_folder, "%d.npy" % i)
+        np.save(data_path, get_data(mode, n, bug=bug, dtype=dtype))
+
+        for size, dpi, cmap, interpolation in itertools.product(sizes, dpis, cmaps, interpolations):
+            tech_spec_name = get_tech_spec_name(mode, n, size, dpi, cmap, interpolation, bug)
+            yield data_path, add_tech_spec_name(output, tech_spec_name), cmap, size, dpi, interpolation, renderer
+
+def render_batch(output, modes, ns, cmaps, sizes, dpis, interpolations, renderer="auto", bug=False, dtype=None, workers=None):
+    with tempfile.TemporaryDirectory(prefix="mosaic-data-") as data_folder:
+        variants = get_variants(data_folder, output, modes, ns, cmaps, sizes, dpis, interpolations, renderer, bug, dtype)
+        for rendered in parallel_map(render_variant, variants, workers):
+            print(rendered)
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.RawTextHelpFormatter,
+            description="render every combination of the given mosaic parameters")
+
+    parser.add_argument("output", help="output file (PNG), the tech spec name of each variant is appended to it", type=str)
+    parser.add_argument("--modes", "-m", help="data arrangement patterns", type=str, nargs="+", required=True, choices=get_data_modes())
+    parser.add_argument("--n", "-n", help="sizes of matrix (n x n)", type=int, nargs="+", required=True)
+    parser.add_argument("--cmaps", "-c", help="color maps", type=str, nargs="+", choices=plt.colormaps(), default=["viridis"])
+    parser.add_argument("--dpis", "-d", help="dots (pixels) per inch", type=int, nargs="+", default=[100])
+    parser.add_argument("--sizes", "-s", help="sizes in inches", type=size_str, nargs="+", default=[(30, 30)])
+    parser.add_argument("--interpolations", "-i", help="interpolation methods (see go_mosaic.py)", type=str, nargs="+", default=["nearest"],
+            choices=INTERPOLATIONS)
+    parser.add_argument("--renderer", "-r", help="see go_mosaic.py", type=str, default="auto", choices=RENDERERS)
+    parser.add_argument("--dtype", help="numpy dtype of the data matrices", type=str, default=None, choices=DTYPES)
+    parser.add_argument("--bug", help="change one thing (only for odd n's)", action="store_true", default=False)
+    parser.add_argument("--workers", "-w", help="number of rendering processes (0 = all cores)", type=int, default=0)
+
+    args = parser.parse_args()
+
+    render_batch(args.output, args.modes, args.n, args.cmaps, args.sizes, args.dpis, args.interpolations,
+            args.renderer, args.bug, args.dtype, args.workers or None)
+
+if __name__ == "__main__":
+    main()
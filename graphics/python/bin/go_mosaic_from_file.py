@@ -4,7 +4,6 @@ import os
 import sys
 
 import matplotlib.pyplot as plt
-import numpy as np
 
 """
 This script creates a mosaic, which is a grid of different colors/shades
@@ -17,34 +16,61 @@ It uses a file as an input buffer (using its binary data to affect the form of t
 # trick for making local package imports work
 sys.path.append(os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), ".."))
 
-from collage import get_dimensions_by_num_items
+from filemosaic import ANALYSES
+from filemosaic import BLOCK_STATS
+from filemosaic import DEFAULT_MAX_CELLS
+from filemosaic import LAYOUTS
+from filemosaic import analyze
+from filemosaic import open_file_data
+from filemosaic import to_grid
+from filemosaic import to_hilbert_grid
+from grid import get_best_dimensions
 from mosaic import get_parser
 from mosaic import save_figure
 
 
-def square_mosaic_file_data(output, input_file, cmap, size, dpi, interpolation):
-    data = np.frombuffer(open(input_file, 'rb').read(), "uint8")
-    rows, cols = get_dimensions_by_num_items(len(data))
-    ncells = rows * cols
-    data = np.concatenate((data, np.array([0] * (ncells - len(data)))))
-    data = data.reshape((rows, cols))
-    save_figure(data, output, cmap, size, dpi, interpolation)
+def square_mosaic_file_data(output, input_file, cmap, size, dpi, interpolation, renderer="auto",
+        max_cells=DEFAULT_MAX_CELLS, block_stat="mean", analysis="bytes", window=256, step=None, layout="rows"):
+    data = open_file_data(input_file)
+
+    # big files are reduced to at most max_cells values, so memory use stays flat
+    data = analyze(data, analysis, max_cells, block_stat, window, step)
+
+    if layout == "hilbert":
+        data = to_hilbert_grid(data)
+    else:
+        # transposed, so the grid comes out landscape rather than portrait
+        rows, cols = get_best_dimensions(len(data))
+        data = to_grid(data, rows, cols)
+
+    save_figure(data, output, cmap, size, dpi, interpolation, renderer)
 
 def square_it_up():
     parser = get_parser()
 
     parser.add_argument("input", help="input file as data for mosaic", type=str)
+    parser.add_argument("--max-cells", "-mc", help="files bigger than this are reduced to this many blocks of bytes (0 = never)",
+            type=int, default=DEFAULT_MAX_CELLS)
+    parser.add_argument("--block-stat", "-bs", help="value of each block when reducing", type=str, choices=BLOCK_STATS, default="mean")
+    parser.add_argument("--analysis", "-a", help="what each cell shows: raw byte values, sliding window entropy or byte class\n"
+            "(null, control, whitespace, printable, high, 0xff)", type=str, choices=ANALYSES, default="bytes")
+    parser.add_argument("--window", "-W", help="entropy window size in bytes", type=int, default=256)
+    parser.add_argument("--step", "-S", help="entropy window step in bytes (default: window size), must divide the window", type=int, default=None)
+    parser.add_argument("--layout", "-l", help="order of cells: row by row, or along a Hilbert curve", type=str, choices=LAYOUTS, default="rows")
 
     args = parser.parse_args()
 
     if args.tsn:
-        tech_spec_name = "-".join(("%s" % os.path.basename(args.input), "%dx%dinch" % args.size, "%ddpi" % args.dpi,
-            args.cmap, args.interpolation))
+        tech_spec_name = "-".join(filter(None, ("%s" % os.path.basename(args.input), "%dx%dinch" % args.size, "%ddpi" % args.dpi,
+            args.cmap, args.interpolation,
+            args.analysis if args.analysis != "bytes" else "",
+            args.layout if args.layout != "rows" else "")))
         filename, ext = os.path.splitext(args.output)
         args.output = "%s-%s%s" % (filename, tech_spec_name, ext)
 
     print(args.output, args.input, args.cmap, args.size, args.dpi, args.interpolation)
-    square_mosaic_file_data(args.output, args.input, args.cmap, args.size, args.dpi, args.interpolation)
+    square_mosaic_file_data(args.output, args.input, args.cmap, args.size, args.dpi, args.interpolation, args.renderer,
+            args.max_cells, args.block_stat, args.analysis, args.window, args.step, args.layout)
 
 if __name__ == "__main__":
     square_it_up()
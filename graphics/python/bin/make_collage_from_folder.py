@@ -1,5 +1,6 @@
 #!/usr/local/bin/python3
 
+import argparse
 import glob
 import math
 import os
@@ -8,35 +9,48 @@ import sys
 # trick for making local package imports work
 sys.path.append(os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), ".."))
 
+from common import THUMBNAIL_CACHE_DIR
+from common import ThumbnailCache
 from common import get_image_files_by_folder
+from common import get_median_image_ratio
 
 from collage import create_collage
-from collage import get_dimensions_by_num_items
 from collage import DEFAULT_CANVAS_SIZE
 
+from grid import get_best_dimensions
 
-def main():
-    if not len(sys.argv) >= 2:
-        print("usage: %s <folder> [<hw-ratio>]" % sys.argv[0])
-        sys.exit(1)
 
-    ratio = 1
-    if len(sys.argv) >= 3:
-        ratio = float(sys.argv[2])
+def get_parser_args():
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument("folder", help="folder of input images", type=str)
+    parser.add_argument("ratio", help="desired h/w ratio of the grid", type=float, nargs="?", default=1)
+
+    parser.add_argument("--thumbnail-cache", "-tc", help="folder for caching resized tiles between runs", type=str, default=THUMBNAIL_CACHE_DIR)
+    parser.add_argument("--no-thumbnail-cache", "-ntc", help="don't cache resized tiles", action="store_false", dest="use_thumbnail_cache")
+
+    return parser.parse_args()
+
+
+def main():
+    args = get_parser_args()
+    ratio = args.ratio
 
-    files = get_image_files_by_folder(sys.argv[1])
+    files = get_image_files_by_folder(args.folder)
     nfiles = len(files)
     print("%d pics found" % nfiles)
 
     canvas_width, canvas_height = DEFAULT_CANVAS_SIZE
-    cols, rows = get_dimensions_by_num_items(nfiles, ratio)
+    # the grid's cells are shaped (as much as the ratio allows) like the images, so they get stretched as little as possible
+    cols, rows = get_best_dimensions(nfiles, ratio, tile_ratio=get_median_image_ratio(files))
     print("canvas size (w X h): %d x %d px" % (canvas_width, canvas_height))
     print("grid dimensions (c X r) %d x %d" % (cols, rows))
     print("ratio: %.2f" % (rows/cols))
 
 
     output = "collage.png"
-    create_collage(files, canvas_width, canvas_height, cols, rows, output)
+    cache = ThumbnailCache(args.thumbnail_cache) if args.use_thumbnail_cache else None
+    create_collage(files, canvas_width, canvas_height, cols, rows, output, cache=cache)
 
 
 if __name__ == "__main__":
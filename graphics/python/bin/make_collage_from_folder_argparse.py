@@ -10,6 +10,9 @@ import sys
 sys.path.append(os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), ".."))
 
 from common import CANVAS_SIZES
+from common import DECODE_QUALITIES
+from common import THUMBNAIL_CACHE_DIR
+from common import ThumbnailCache
 from common import get_canvas_presets
 from common import parse_size_str
 
@@ -34,6 +37,14 @@ def get_parser_args():
 
     parser.add_argument("--randomize-order", "-ro", help="shuffle the input files", action="store_true", dest="random")
 
+    parser.add_argument("--decode-quality", "-dq", help="tile decoding quality (exact = full decode, balanced/fast = reduced-resolution decode)",
+            type=str, choices=DECODE_QUALITIES.keys(), default="exact", dest="quality")
+    parser.add_argument("--thumbnail-cache", "-tc", help="folder for caching resized tiles between runs", type=str, default=THUMBNAIL_CACHE_DIR)
+    parser.add_argument("--no-thumbnail-cache", "-ntc", help="don't cache resized tiles", action="store_false", dest="use_thumbnail_cache")
+    parser.add_argument("--streaming", "-st", help="compose & write the collage one row of tiles at a time (for huge canvases, .tif output for TIFF)",
+            action="store_true")
+    parser.add_argument("--workers", "-w", help="number of processes decoding & resizing tiles (0 = all cores)", type=int, default=1)
+
     args = parser.parse_args()
     return args
 
@@ -65,7 +76,10 @@ def main():
     print("sqrt(%d) = %f" % (count, sqrt))
     print("creating an %d (c) x %d (r) collage" % (cols, rows))
     print("collage size: %d (w) x %d (h)" % canvas_size)
-    create_collage(pics, *canvas_size, cols, rows, args.output)
+
+    cache = ThumbnailCache(args.thumbnail_cache) if args.use_thumbnail_cache else None
+    create_collage(pics, *canvas_size, cols, rows, args.output, workers=args.workers or None, quality=args.quality, cache=cache,
+            streaming=args.streaming)
 
 
 if __name__ == "__main__":
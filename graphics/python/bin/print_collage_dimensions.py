@@ -7,8 +7,12 @@ import sys
 sys.path.append(os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), ".."))
 
 from common import get_image_files_by_folder
+from common import get_median_image_ratio
 from collage import get_dimensions_by_num_items
 from collage import print_table_of_dimension_options_highlight_best
+from grid import solve_dimensions
+
+NUM_LAYOUTS = 5
 
 
 def main():
@@ -18,11 +22,13 @@ def main():
         sys.exit(1)
 
     nfiles = 0
+    tile_ratio = None
     if sys.argv[1].isdigit():
         nfiles = int(sys.argv[1])
     else:
         files = get_image_files_by_folder(sys.argv[1])
         nfiles = len(files)
+        tile_ratio = get_median_image_ratio(files)
 
     if nfiles < 1:
         print("not enough images (<1)")
@@ -42,6 +48,10 @@ def main():
     print("n: %s, w: %s, h: %s, w*h: %s, h/w: %s, extras: %s" % (nfiles, w, h, w*h, h/w, w*h - nfiles))
     print_table_of_dimension_options_highlight_best(nfiles, ratio, pad)
 
+    print("best layouts:" + (" (tiles h/w: %.2f)" % tile_ratio if tile_ratio else ""))
+    for layout in solve_dimensions(nfiles, ratio, tile_ratio, top=NUM_LAYOUTS):
+        print("%5d x %-5d cost: %.4f (aspect: %.4f, waste: %.4f, distortion: %.4f)" % layout)
+
 
 if __name__ == "__main__":
     main()
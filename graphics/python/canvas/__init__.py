@@ -0,0 +1,190 @@
+"""
+Streaming image writers
+
+Images are written top to bottom, one strip (a horizontal band of rows) at a time,
+so only the current strip has to be held in memory, regardless of the size of the whole image.
+
+Supported outputs:
+- PNG (RGB, 8 bit, zlib compressed)
+- TIFF (RGB, 8 bit, uncompressed, up to 4GB)
+
+If the with block raises, the partial output is deleted rather than finished.
+
+Usage:
+
+with open_strip_writer("out.png", (width, height)) as writer:
+    for strip in strips:
+        writer.write(strip)
+"""
+
+import os
+import struct
+import zlib
+
+import numpy as np
+
+
+def _to_rows(strip, width):
+    "strip (PIL image or array) -> uint8 array of shape (rows, width * 3)"
+    if hasattr(strip, "convert"):
+        strip = strip.convert("RGB")
+    arr = np.asarray(strip, dtype=np.uint8)
+    if arr.ndim != 3 or arr.shape[1] != width or arr.shape[2] != 3:
+        raise ValueError("strip must be RGB and %d px wide, got shape %s" % (width, arr.shape))
+    return arr.reshape(arr.shape[0], width * 3)
+
+
+class PNGStripWriter:
+    def __init__(self, output, size, compress_level=6):
+        self.output = output
+        self.width, self.height = size
+        self.rows_written = 0
+
+        self._file = open(output, "wb")
+        self._compressor = zlib.compressobj(compress_level)
+
+        self._file.write(b"\x89PNG\r\n\x1a\n")
+        # 8 bit depth, color type 2 (RGB), default compression/filter/interlace
+        self._write_chunk(b"IHDR", struct.pack(">IIBBBBB", self.width, self.height, 8, 2, 0, 0, 0))
+
+    def _write_chunk(self, chunk_type, data):
+        self._file.write(struct.pack(">I", len(data)))
+        self._file.write(chunk_type)
+        self._file.write(data)
+        self._file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type))))
+
+    def write(self, strip):
+        rows = _to_rows(strip, self.width)
+        rows = rows[:self.height - self.rows_written]
+
+        # every row gets the "sub" filter (difference from the pixel to the left), which compresses photos much better
+        filtered = np.empty((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 1
+        filtered[:, 1:4] = rows[:, :3]
+        np.subtract(rows[:, 3:], rows[:, :-3], out=filtered[:, 4:])
+
+        data = self._compressor.compress(filtered.tobytes())
+        if data:
+            self._write_chunk(b"IDAT", data)
+
+        self.rows_written += rows.shape[0]
+
+    def close(self):
+        # rows that were never written are left black
+        if self.rows_written < self.height:
+            self.write(np.zeros((self.height - self.rows_written, self.width, 3), dtype=np.uint8))
+
+        self._write_chunk(b"IDAT", self._compressor.flush())
+        self._write_chunk(b"IEND", b"")
+        self._file.close()
+
+    def abort(self):
+        "closes the file and deletes it, without finishing the image"
+        self._file.close()
+        if os.path.exists(self.output):
+            os.remove(self.output)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if exc_info[0]:
+            self.abort()
+        else:
+            self.close()
+
+
+class TIFFStripWriter:
+    # TIFF field types
+    SHORT = 3
+    LONG = 4
+
+    def __init__(self, output, size, rows_per_strip=64):
+        self.output = output
+        self.width, self.height = size
+        self.rows_written = 0
+
+        row_bytes = self.width * 3
+        num_strips = -(-self.height // rows_per_strip)
+        strip_byte_counts = [rows_per_strip * row_bytes] * num_strips
+        strip_byte_counts[-1] = (self.height - rows_per_strip * (num_strips - 1)) * row_bytes
+
+        tags = [
+            (256, self.LONG,  [self.width]),            # ImageWidth
+            (257, self.LONG,  [self.height]),           # ImageLength
+            (258, self.SHORT, [8, 8, 8]),               # BitsPerSample
+            (259, self.SHORT, [1]),                     # Compression: none
+            (262, self.SHORT, [2]),                     # PhotometricInterpretation: RGB
+            (273, self.LONG,  None),                    # StripOffsets (filled below)
+            (277, self.SHORT, [3]),                     # SamplesPerPixel
+            (278, self.LONG,  [rows_per_strip]),        # RowsPerStrip
+            (279, self.LONG,  strip_byte_counts),       # StripByteCounts
+            (284, self.SHORT, [1]),                     # PlanarConfiguration: chunky
+        ]
+
+        # layout: header | IFD | out-of-line tag values | pixel data
+        ifd_offset = 8
+        values_offset = ifd_offset + 2 + len(tags) * 12 + 4
+        values_size = sum(self._values_size(t, len(v) if v is not None else num_strips) for _, t, v in tags)
+        data_offset = values_offset + values_size
+
+        if data_offset + self.height * row_bytes > 0xFFFFFFFF:
+            raise ValueError("image too large for TIFF (> 4GB), use PNG instead")
+
+        strip_offsets = [data_offset + i * rows_per_strip * row_bytes for i in range(num_strips)]
+        tags[5] = (273, self.LONG, strip_offsets)
+
+        ifd = struct.pack("<H", len(tags))
+        values = b""
+        for tag, typ, vals in tags:
+            fmt = "<%d%s" % (len(vals), "H" if typ == self.SHORT else "I")
+            packed = struct.pack(fmt, *vals)
+            if len(packed) <= 4:
+                ifd += struct.pack("<HHI", tag, typ, len(vals)) + packed.ljust(4, b"\0")
+            else:
+                ifd += struct.pack("<HHII", tag, typ, len(vals), values_offset + len(values))
+                values += packed
+        ifd += struct.pack("<I", 0)
+
+        self._file = open(output, "wb")
+        self._file.write(b"II*\0" + struct.pack("<I", ifd_offset))
+        self._file.write(ifd)
+        self._file.write(values)
+
+    def _values_size(self, typ, count):
+        size = count * (2 if typ == self.SHORT else 4)
+        return size if size > 4 else 0
+
+    def write(self, strip):
+        rows = _to_rows(strip, self.width)
+        rows = rows[:self.height - self.rows_written]
+        self._file.write(rows.tobytes())
+        self.rows_written += rows.shape[0]
+
+    def close(self):
+        if self.rows_written < self.height:
+            self.write(np.zeros((self.height - self.rows_written, self.width, 3), dtype=np.uint8))
+        self._file.close()
+
+    def abort(self):
+        "closes the file and deletes it, without finishing the image"
+        self._file.close()
+        if os.path.exists(self.output):
+            os.remove(self.output)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if exc_info[0]:
+            self.abort()
+        else:
+            self.close()
+
+
+def open_strip_writer(output, size, **kwargs):
+    "picks the writer by the output's extension (.tif/.tiff -> TIFF, anything else -> PNG)"
+    ext = os.path.splitext(output)[1].lower()
+    if ext in (".tif", ".tiff"):
+        return TIFFStripWriter(output, size, **kwargs)
+    return PNGStripWriter(output, size, **kwargs)
@@ -4,8 +4,18 @@ import argparse
 from PIL import Image
 import numpy as np
 import os
+import sys
 import tqdm
 
+# trick for making local package imports work
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), ".."))
+
+from gif import PaletteGIFWriter
+from gif import get_global_palette
+
+# frames the gif's palette is computed from
+PALETTE_SAMPLES = 12
+
 def create_gradient_gif(output_folder, img_size, shape, palette, gradient_start, num_frames):
     circle_size = 0.95
 
@@ -21,10 +31,7 @@ def create_gradient_gif(output_folder, img_size, shape, palette, gradient_start,
     if shape == 'circle':
         mask = x**2 + y**2 <= radius**2
 
-    # List to hold each frame of the GIF
-    frames = []
-
-    for frame in tqdm.tqdm(range(num_frames), desc="generating frames"):
+    def get_frame(frame):
         # Create an array to hold the image data
         img_data = np.ones((img_size, img_size, 3))
 
@@ -42,16 +49,19 @@ def create_gradient_gif(output_folder, img_size, shape, palette, gradient_start,
             img_data[..., 1] = np.where(mask, color[1] * gradient + img_data[..., 1] * (1 - gradient), img_data[..., 1])
             img_data[..., 2] = np.where(mask, color[2] * gradient + img_data[..., 2] * (1 - gradient), img_data[..., 2])
 
-        # Convert to an 8-bit PIL image and append to frames list
-        frames.append(Image.fromarray((img_data * 255).astype('uint8')))
+        # Convert to an 8-bit PIL image
+        return Image.fromarray((img_data * 255).astype('uint8'))
 
     # Determine the index of the last saved file in the output folder
     index = 1
     while os.path.exists(os.path.join(output_folder, f"{index:02d}.gif")):
         index += 1
 
-    # Save frames as a GIF
-    frames[0].save(os.path.join(output_folder, f"{index:02d}.gif"), save_all=True, append_images=frames[1:], optimize=False, duration=100, loop=0)
+    # One palette for the whole GIF, frames are written as they're generated (only the parts that changed)
+    gif_palette = get_global_palette(get_frame(frame) for frame in range(0, num_frames, max(1, num_frames // PALETTE_SAMPLES)))
+    with PaletteGIFWriter(os.path.join(output_folder, f"{index:02d}.gif"), gif_palette, duration=100, loop=0) as writer:
+        for frame in tqdm.tqdm(range(num_frames), desc="generating frames"):
+            writer.write(get_frame(frame))
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Create a gradient animation.')
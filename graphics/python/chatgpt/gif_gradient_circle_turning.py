@@ -4,8 +4,18 @@ import argparse
 from PIL import Image
 import numpy as np
 import os
+import sys
 import tqdm
 
+# trick for making local package imports work
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), ".."))
+
+from gif import PaletteGIFWriter
+from gif import get_global_palette
+
+# frames the gif's palette is computed from
+PALETTE_SAMPLES = 12
+
 def create_gradient_gif(filename, img_size, start_color1, start_color2, end_color, gradient_start, num_frames):
 
     circle_size = 0.95
@@ -23,10 +33,7 @@ def create_gradient_gif(filename, img_size, start_color1, start_color2, end_colo
     # Rotation speed
     rotation_speed = 2 * np.pi / num_frames  # full rotation
 
-    # List to hold each frame of the GIF
-    frames = []
-
-    for frame in tqdm.tqdm(range(num_frames), desc="Generating frames"):
+    def get_frame(frame):
         # Interpolate between color sets in a cyclic way
         t = (np.cos((frame / num_frames) * 2 * np.pi) + 1) / 2
         start_color = (1 - t) * start_color1 + t * start_color2
@@ -43,9 +50,9 @@ def create_gradient_gif(filename, img_size, start_color1, start_color2, end_colo
         for i in range(3):
             img_data[..., i] = np.where(mask, start_color[i] + (end_color[i] - start_color[i]) * phi, 1)
 
-        # Convert to an 8-bit PIL image and append to frames list
-        frames.append(Image.fromarray((img_data * 255).astype('uint8')))
-    
+        # Convert to an 8-bit PIL image
+        return Image.fromarray((img_data * 255).astype('uint8'))
+
     # Check if file exists and append a sequence number if it does
     base_filename, extension = os.path.splitext(filename)
     i = 1
@@ -53,9 +60,11 @@ def create_gradient_gif(filename, img_size, start_color1, start_color2, end_colo
         filename = f"{base_filename}_{i}{extension}"
         i += 1
 
-    # Save frames as a GIF
-    print("saving to file...")
-    frames[0].save(filename, save_all=True, append_images=frames[1:], optimize=False, duration=100, loop=0)
+    # One palette for the whole GIF, frames are written as they're generated (only the parts that changed)
+    palette = get_global_palette(get_frame(frame) for frame in range(0, num_frames, max(1, num_frames // PALETTE_SAMPLES)))
+    with PaletteGIFWriter(filename, palette, duration=100, loop=0) as writer:
+        for frame in tqdm.tqdm(range(num_frames), desc="Generating frames"):
+            writer.write(get_frame(frame))
 
     # Display the GIF
     #Image.open('rotating_gradient.gif').show()
@@ -1,29 +1,34 @@
 #!/usr/local/bin/python3
 
 import os
+import sys
 import argparse
-import numpy as np
-from PIL import Image
 import tqdm
 import random
 
+# trick for making local package imports work
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), ".."))
+
+from frames import add_sink_arguments
+from frames import get_sink
+from frames import list_frame_names
+from frames import interpolate_color
+from frames import solid_frame
+
 def hex_to_rgb(value):
     # Convert hex color to RGB
     value = value.lstrip('#')
     length = len(value)
     return tuple(int(value[i:i+length//3], 16) for i in range(0, length, length//3))
 
-def interpolate_color(color1, color2, factor):
-    return tuple(np.array(color1) * (1 - factor) + np.array(color2) * factor)
-
-def create_gradient_frames(output_folder, colors, num_frames, img_size, randomize):
+def create_gradient_frames(output_folder, colors, num_frames, img_size, randomize, sink):
     # Create the output folder if it doesn't exist
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
     # Find the last batch and index used in the output folder
     last_batch = 0
-    for filename in os.listdir(output_folder):
+    for filename in list_frame_names(output_folder):
         if filename.endswith('.png'):
             batch = filename.split('.')[0].split('_')[0]  # Get the batch from the filename
             last_batch = max(last_batch, int(batch))
@@ -36,9 +41,6 @@ def create_gradient_frames(output_folder, colors, num_frames, img_size, randomiz
 
     # Iterate over each frame
     for frame in tqdm.tqdm(range(num_frames), desc="generating frames"):
-        # Create a new image with the given size
-        img = Image.new('RGB', img_size)
-
         # Use a color from the spectrum
         hue = (frame / (num_frames - 1)) * (len(colors) - 1)  # Hue value, from 0 to len(colors) - 1
         lower_color = colors[int(hue)]  # Lower bound color
@@ -52,13 +54,11 @@ def create_gradient_frames(output_folder, colors, num_frames, img_size, randomiz
             randomized_color = (random.randint(0, 255), random.randint(0, 255), random.randint(0, 255))
             color = interpolate_color(color, randomized_color, random.random())
 
-        # Fill the image with the color
-        for i in range(img_size[0]):
-            for j in range(img_size[1]):
-                img.putpixel((i, j), tuple(map(int, color)))
+        # Create a new image with the given size, filled with the color
+        img = solid_frame(img_size, color)
 
         # Save the image with a batch prefix and a 5-digit index
-        img.save(os.path.join(output_folder, f'{next_batch:02d}_{frame + 1:05d}.png'))
+        sink.write(img, os.path.join(output_folder, f'{next_batch:02d}_{frame + 1:05d}.png'))
 
 def main():
     # Initialize the parser
@@ -68,6 +68,7 @@ def main():
     parser.add_argument('-n', '--num_frames', type=int, default=100, help="Number of frames to generate")
     parser.add_argument('-s', '--img_size', type=int, nargs=2, default=[3840, 2160], help="Image size [width, height]")
     parser.add_argument('-r', '--randomize', type=int, default=0, help="Enable color randomization (0: disabled, 1: enabled)")
+    add_sink_arguments(parser)
 
     # Parse the arguments
     args = parser.parse_args()
@@ -77,7 +78,8 @@ def main():
 
 
     # Call the function to create the frames
-    create_gradient_frames(args.output_folder, colors, args.num_frames, tuple(args.img_size), args.randomize)
+    with get_sink(args) as sink:
+        create_gradient_frames(args.output_folder, colors, args.num_frames, tuple(args.img_size), args.randomize, sink)
 
 if __name__ == "__main__":
     main()
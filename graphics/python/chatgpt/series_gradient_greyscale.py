@@ -2,52 +2,64 @@
 
 import os
 import sys
-from PIL import Image
+import argparse
 import tqdm
 
-# Get the number of frames and reverse flag from the command line arguments
-num_frames = int(sys.argv[1]) if len(sys.argv) > 1 else 16
-reverse = sys.argv[2] == 'reverse' if len(sys.argv) > 2 else False
+# trick for making local package imports work
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), ".."))
 
-# Define the size of the image
-width = 3840
-height = 2160
+from frames import add_sink_arguments
+from frames import get_sink
+from frames import list_frame_names
+from frames import solid_frame
 
-# Define the output folder name
-output_folder = 'data/gradient_greyscale'
+def main():
+    # Get the number of frames and reverse flag from the command line arguments
+    parser = argparse.ArgumentParser(description="Generate greyscale frames, black to white")
+    parser.add_argument('num_frames', type=int, nargs='?', default=16, help="Number of frames to generate")
+    parser.add_argument('reverse', nargs='?', choices=['reverse'], help="White to black instead")
+    add_sink_arguments(parser)
+    args = parser.parse_args()
+    num_frames = args.num_frames
+    reverse = args.reverse == 'reverse'
 
-# Create the output folder if it doesn't exist
-if not os.path.exists(output_folder):
-    os.makedirs(output_folder)
+    # Define the size of the image
+    width = 3840
+    height = 2160
 
-# Find the last index used in the output folder
-last_index = 0
-for filename in os.listdir(output_folder):
-    if filename.endswith('.png'):
-        index = int(filename.split('_')[1].split('.')[0])  # Get the index from the filename
-        last_index = max(last_index, index)
+    # Define the output folder name
+    output_folder = 'data/gradient_greyscale'
 
-# Iterate over each frame
-for frame in tqdm.tqdm(range(num_frames), desc="generating frames"):
-    # Create a new image with the given size
-    img = Image.new('RGB', (width, height))
+    # Create the output folder if it doesn't exist
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
 
-    # Determine the value for this frame
-    value = frame / (num_frames - 1)  # Value in HSV, from 0 to 1
-    if reverse:
-        value = 1 - value  # Reverse the gradient
+    # Find the last index used in the output folder
+    last_index = 0
+    for filename in list_frame_names(output_folder):
+        if filename.endswith('.png'):
+            index = int(filename.split('_')[1].split('.')[0])  # Get the index from the filename
+            last_index = max(last_index, index)
 
-    # Convert to 8-bit grayscale
-    gray = int(value * 255)
+    # Iterate over each frame
+    with get_sink(args) as sink:
+        for frame in tqdm.tqdm(range(num_frames), desc="generating frames"):
+            # Determine the value for this frame
+            value = frame / (num_frames - 1)  # Value in HSV, from 0 to 1
+            if reverse:
+                value = 1 - value  # Reverse the gradient
 
-    # Fill the image with the color
-    for i in range(width):
-        for j in range(height):
-            img.putpixel((i, j), (gray, gray, gray))
+            # Convert to 8-bit grayscale
+            gray = int(value * 255)
 
-    # Save the image with a batch prefix and a 5-digit index
-    img.save(os.path.join(output_folder, f'01_%s{last_index + frame + 1:05d}.png' % (reverse and "rev_" or "")))
+            # Create a new image with the given size, filled with the color
+            img = solid_frame((width, height), (gray, gray, gray))
 
-# Display the last frame
-#display(img)
+            # Save the image with a batch prefix and a 5-digit index
+            sink.write(img, os.path.join(output_folder, f'01_%s{last_index + frame + 1:05d}.png' % (reverse and "rev_" or "")))
 
+    # Display the last frame
+    #display(img)
+
+if __name__ == "__main__":
+    main()
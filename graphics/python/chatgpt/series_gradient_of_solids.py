@@ -1,11 +1,19 @@
 #!/usr/local/bin/python3
 
 import os
+import sys
 import argparse
-import colorsys
-from PIL import Image
 from tqdm import tqdm
 
+# trick for making local package imports work
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), ".."))
+
+from frames import add_sink_arguments
+from frames import get_sink
+from frames import list_frame_names
+from frames import hsv_to_rgb8
+from frames import solid_frame
+
 def main():
     # Initialize the parser
     parser = argparse.ArgumentParser(description="Generate color gradient frames",
@@ -13,6 +21,7 @@ def main():
     parser.add_argument('--output_folder', type=str, default='data/gradient_of_solids', help="Folder to output frames")
     parser.add_argument('--num_frames', type=int, default=100, help="Number of frames to generate")
     parser.add_argument('--img_size', type=int, nargs=2, default=[3840, 2160], help="Image size [width, height]")
+    add_sink_arguments(parser)
 
     # Parse the arguments
     args = parser.parse_args()
@@ -23,7 +32,7 @@ def main():
 
     # Find the last batch and index used in the output folder
     last_index = 0
-    for filename in os.listdir(args.output_folder):
+    for filename in list_frame_names(args.output_folder):
         if filename.endswith('.png'):
             index = filename.split('.')[0]
             last_index = max(last_index, int(index))
@@ -31,25 +40,18 @@ def main():
     current_index = last_index + 1
 
     # Iterate over each frame
-    for frame in tqdm(range(args.num_frames), desc="generating frames"):
-        # Create a new image with the given size
-        img = Image.new('RGB', tuple(args.img_size))
-
-        # Use a color from the spectrum
-        hue = frame / (args.num_frames - 1)  # Hue value, from 0 to 1
-        color = colorsys.hsv_to_rgb(hue, 1, 1)  # Convert hue to RGB
-
-        # Convert to 8-bit RGB
-        r, g, b = [int(c * 255) for c in color]
-
-        # Fill the image with the color
-        for i in range(args.img_size[0]):
-            for j in range(args.img_size[1]):
-                img.putpixel((i, j), (r, g, b))
-
-        # Save the image with a frame index
-        img.save(os.path.join(args.output_folder, f'{current_index:05d}.png'))
-        current_index += 1
+    with get_sink(args) as sink:
+        for frame in tqdm(range(args.num_frames), desc="generating frames"):
+            # Use a color from the spectrum
+            hue = frame / (args.num_frames - 1)  # Hue value, from 0 to 1
+            color = hsv_to_rgb8(hue, 1, 1)  # Convert hue to 8-bit RGB
+
+            # Create a new image with the given size, filled with the color
+            img = solid_frame(args.img_size, color)
+
+            # Save the image with a frame index
+            sink.write(img, os.path.join(args.output_folder, f'{current_index:05d}.png'))
+            current_index += 1
 
 if __name__ == "__main__":
     main()
@@ -2,56 +2,63 @@
 
 import os
 import sys
-from PIL import Image
-import colorsys
-
-# Get the number of frames from the command line arguments
-num_frames = int(sys.argv[1]) if len(sys.argv) > 1 else 100
-
-# Define the size of the image
-width = 800
-height = 800
-
-# Define the hue for magenta in the HSV color space
-magenta_hue = 5 / 6
-
-# Define the output folder name
-output_folder = 'gradient_single_shade'
-
-# Create the output folder if it doesn't exist
-if not os.path.exists(output_folder):
-    os.makedirs(output_folder)
-
-# Find the last index used in the output folder
-last_index = 0
-for filename in os.listdir(output_folder):
-    if filename.endswith('.png'):
-        index = int(filename.split('_')[1].split('.')[0])  # Get the index from the filename
-        last_index = max(last_index, index)
-
-# Iterate over each frame
-for frame in range(num_frames):
-    # Create a new image with the given size
-    img = Image.new('RGB', (width, height))
-
-    # Determine the value for this frame
-    value = frame / (num_frames - 1)  # Value in HSV, from 0 to 1
-
-    # Convert HSV to RGB
-    color = colorsys.hsv_to_rgb(magenta_hue, 1, value)
-
-    # Convert to 8-bit RGB
-    r, g, b = [int(c * 255) for c in color]
-
-    # Fill the image with the color
-    for i in range(width):
-        for j in range(height):
-            img.putpixel((i, j), (r, g, b))
-
-    # Save the image with a batch prefix and a 5-digit index
-    img.save(os.path.join(output_folder, f'01_{last_index + frame + 1:05d}.png'))
-
-# Display the last frame
-#display(img)
-
-
+import argparse
+
+# trick for making local package imports work
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), ".."))
+
+from frames import add_sink_arguments
+from frames import get_sink
+from frames import list_frame_names
+from frames import hsv_to_rgb8
+from frames import solid_frame
+
+def main():
+    # Get the number of frames from the command line arguments
+    parser = argparse.ArgumentParser(description="Generate frames of a single shade (magenta)")
+    parser.add_argument('num_frames', type=int, nargs='?', default=100, help="Number of frames to generate")
+    add_sink_arguments(parser)
+    args = parser.parse_args()
+    num_frames = args.num_frames
+
+    # Define the size of the image
+    width = 800
+    height = 800
+
+    # Define the hue for magenta in the HSV color space
+    magenta_hue = 5 / 6
+
+    # Define the output folder name
+    output_folder = 'gradient_single_shade'
+
+    # Create the output folder if it doesn't exist
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+
+    # Find the last index used in the output folder
+    last_index = 0
+    for filename in list_frame_names(output_folder):
+        if filename.endswith('.png'):
+            index = int(filename.split('_')[1].split('.')[0])  # Get the index from the filename
+            last_index = max(last_index, index)
+
+    # Iterate over each frame
+    with get_sink(args) as sink:
+        for frame in range(num_frames):
+            # Determine the value for this frame
+            value = frame / (num_frames - 1)  # Value in HSV, from 0 to 1
+
+            # Convert HSV to 8-bit RGB
+            color = hsv_to_rgb8(magenta_hue, 1, value)
+
+            # Create a new image with the given size, filled with the color
+            img = solid_frame((width, height), color)
+
+            # Save the image with a batch prefix and a 5-digit index
+            sink.write(img, os.path.join(output_folder, f'01_{last_index + frame + 1:05d}.png'))
+
+    # Display the last frame
+    #display(img)
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,17 @@
 #!/usr/local/bin/python3
 
 import os
+import sys
 import argparse
-from PIL import Image
 from tqdm import tqdm
 
+# trick for making local package imports work
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), ".."))
+
+from frames import add_sink_arguments
+from frames import get_sink
+from frames import solid_frame
+
 # Map a number to an RGB color
 def num_to_rgb(num):
     return (num // 65536, (num // 256) % 256, num % 256)
@@ -21,6 +28,7 @@ def main():
     parser.add_argument('--output_folder', type=str, default='data/color_frames', help="Folder to output frames")
     parser.add_argument('--range', type=int, nargs=3, default=[0, 16777215, 1], help="Color range [start, end, step] and step size")
     parser.add_argument('--img_size', type=int, nargs=2, default=[3840, 2160], help="Image size [width, height]")
+    add_sink_arguments(parser)
 
     # Parse the arguments
     args = parser.parse_args()
@@ -30,14 +38,15 @@ def main():
         os.makedirs(args.output_folder)
 
     # Generate the sequence of colors
-    for num in tqdm(range(*args.range), desc="generating frames"):
-        color = num_to_rgb(num)
+    with get_sink(args) as sink:
+        for num in tqdm(range(*args.range), desc="generating frames"):
+            color = num_to_rgb(num)
 
-        # Create a new image with the given size and fill it with the color
-        img = Image.new('RGB', tuple(args.img_size), color=color)
+            # Create a new image with the given size and fill it with the color
+            img = solid_frame(args.img_size, color)
 
-        # Save the image with a frame index
-        img.save(os.path.join(args.output_folder, f'{num + 1:05d}.png'))
+            # Save the image with a frame index
+            sink.write(img, os.path.join(args.output_folder, f'{num + 1:05d}.png'))
 
 if __name__ == "__main__":
     main()
@@ -1,38 +1,122 @@
 #!/usr/local/bin/python3
 
 import cv2
+import functools
+import json
 import os
+import sys
 import argparse
 import tqdm
 
-def create_blurred_images(input_dir, output_dir, output_dimensions, blur_strength):
+# trick for making local package imports work
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), ".."))
+
+from common import parallel_map
+
+OUTPUT_PREFIX = 'image_blurred_'
+
+# source mtime & parameters of each output, kept in the output directory
+OUTPUT_PARAMS_NAME = '.blur-params.json'
+
+# kernel size of the blur at the source's resolution
+BLUR_KERNEL_SIZE = 99
+
+def get_kernel_size(scale):
+    # The blur kernel scaled like the image, kept odd
+    return max(1, int(round(BLUR_KERNEL_SIZE * scale)) | 1)
+
+def blur_and_resize(source_image, output_dimensions, blur_strength):
+    # Same as blurring at the source's resolution and then resizing, but when downscaling, the image is resized
+    # first and blurred with a kernel & sigma scaled to match (a lot less pixels to blur)
+    height, width = source_image.shape[:2]
+    scale_x, scale_y = output_dimensions[0] / width, output_dimensions[1] / height
+    if scale_x > 1 or scale_y > 1:
+        image_blurred = cv2.GaussianBlur(source_image, (BLUR_KERNEL_SIZE, BLUR_KERNEL_SIZE), blur_strength)
+        return cv2.resize(image_blurred, output_dimensions)  # cv2 uses width x height
+
+    image_resized = cv2.resize(source_image, output_dimensions, interpolation=cv2.INTER_AREA)
+    kernel_size = (get_kernel_size(scale_x), get_kernel_size(scale_y))
+    return cv2.GaussianBlur(image_resized, kernel_size, sigmaX=blur_strength * scale_x, sigmaY=blur_strength * scale_y)
+
+def load_output_params(output_dir):
+    # {output filename: the source mtime & parameters it was made with}, from the sidecar in the output directory
+    try:
+        with open(os.path.join(output_dir, OUTPUT_PARAMS_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_output_params(output_dir, output_params):
+    path = os.path.join(output_dir, OUTPUT_PARAMS_NAME)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(output_params, f)
+    os.replace(path + '.tmp', path)
+
+def get_output_params(source_file, output_dimensions, blur_strength):
+    return {'source_mtime': os.stat(source_file).st_mtime_ns, 'output_dimensions': list(output_dimensions), 'blur_strength': blur_strength}
+
+def create_blurred_image(files, output_dimensions, blur_strength):
+    # -> whether the image was written (False when the source couldn't be decoded)
+    image_file_full_path, output_file = files
+
+    # Load the source image
+    source_image = cv2.imread(image_file_full_path)
+    if source_image is None:
+        return False
+    # Blur the image & resize it to the output dimensions
+    image_blurred = blur_and_resize(source_image, output_dimensions, blur_strength)
+
+    # Write the image
+    cv2.imwrite(output_file, image_blurred)
+    return True
+
+def init_worker():
+    # One cv2 thread per worker process, the pool is the parallelism
+    cv2.setNumThreads(1)
+
+def create_blurred_images(input_dir, output_dir, output_dimensions, blur_strength, workers=None, force=False):
+    # Write next to the source images when there's no output directory (never over them)
+    output_dir = output_dir or input_dir
+    in_place = os.path.realpath(output_dir) == os.path.realpath(input_dir)
     # Get all files in the input directory
     files = os.listdir(input_dir)
-    # Filter out non-image files
-    images = [file for file in files if file.endswith(('jpg', 'png', 'jpeg'))]
-
-    for image_file in tqdm.tqdm(images, desc="generating images"):
-        image_file_full_path = os.path.join(input_dir, image_file)
-        # Load the source image
-        source_image = cv2.imread(image_file_full_path)
-        # Blur the image
-        image_blurred = cv2.GaussianBlur(source_image, (99, 99), blur_strength)
-        # Resize it to the output dimensions
-        image_resized = cv2.resize(image_blurred, output_dimensions)  # cv2 uses width x height
-
-        # Write the image
-        if args.output_dir:
-            output_file = os.path.join(output_dir, f'image_blurred_{image_file}')
-        else:
-            output_file = image_file_full_path
-        cv2.imwrite(output_file, image_resized)
-    
+    # Filter out non-image files, and earlier outputs (when they're written next to the sources)
+    images = [file for file in files if file.endswith(('jpg', 'png', 'jpeg')) and not (in_place and file.startswith(OUTPUT_PREFIX))]
+
+    # Outputs are up to date if they were made from the same version of the source, with the same parameters
+    output_params = load_output_params(output_dir)
+    jobs = []
+    for image_file in images:
+        output_file = f'{OUTPUT_PREFIX}{image_file}'
+        params = get_output_params(os.path.join(input_dir, image_file), output_dimensions, blur_strength)
+        if not force and output_params.get(output_file) == params and os.path.isfile(os.path.join(output_dir, output_file)):
+            continue
+        output_params.pop(output_file, None)
+        jobs.append((image_file, output_file, params))
+
+    blur = functools.partial(create_blurred_image, output_dimensions=tuple(output_dimensions), blur_strength=blur_strength)
+    results = parallel_map(blur, [(os.path.join(input_dir, image_file), os.path.join(output_dir, output_file)) for image_file, output_file, _ in jobs],
+                           workers, initializer=init_worker if workers is None or workers > 1 else None)
+    num_written = 0
+    try:
+        for (_, output_file, params), written in zip(jobs, tqdm.tqdm(results, total=len(jobs), desc="generating images")):
+            if written:
+                output_params[output_file] = params
+                num_written += 1
+    finally:
+        # Saved even if interrupted, so finished images aren't made again
+        save_output_params(output_dir, output_params)
+
+    print(f'{num_written} written, {len(images) - len(jobs)} up to date, {len(jobs) - num_written} unreadable')
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Script for creating blurred images', formatter_class=argparse.ArgumentDefaultsHelpFormatter)
     parser.add_argument('input_dir', type=str, help='Directory containing source images')
-    parser.add_argument('--output_dir', type=str, default="", help='Directory to save the generated images')
+    parser.add_argument('--output_dir', type=str, default="", help='Directory to save the generated images (default: next to the source images)')
     parser.add_argument('--output_dimensions', type=int, nargs=2, default=[3840, 2160], help='Output image dimensions')
     parser.add_argument('-b', '--blur_strength', type=int, default=30, help='Strength of the blur')
+    parser.add_argument('-w', '--workers', type=int, default=0, help='Number of processes (0 = all cores)')
+    parser.add_argument('-f', '--force', action='store_true', help='Regenerate images that are already up to date (made from the same source, with the same parameters)')
     args = parser.parse_args()
 
     # Create the output directory if it doesn't exist
@@ -40,4 +124,4 @@ if __name__ == "__main__":
         os.makedirs(args.output_dir, exist_ok=True)
 
     # Generate blurred images
-    create_blurred_images(args.input_dir, args.output_dir, args.output_dimensions, args.blur_strength)
+    create_blurred_images(args.input_dir, args.output_dir, args.output_dimensions, args.blur_strength, args.workers or None, args.force)
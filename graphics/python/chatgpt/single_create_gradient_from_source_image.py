@@ -1,49 +1,65 @@
 #!/usr/local/bin/python3
 
 import cv2
+import functools
 import numpy as np
 import os
+import sys
 import argparse
-from sklearn.cluster import KMeans
 from random import choice
 from numpy.random import shuffle
 import tqdm
 
-def extract_colors(image, num_colors):
-    # Reshape the image to be a list of pixels
-    pixels = image.reshape(-1, 3)
-    # Perform K-means clustering to find the most dominant colors
-    kmeans = KMeans(n_clusters=num_colors)
-    kmeans.fit(pixels)
-    colors = kmeans.cluster_centers_
-    # Return the colors
-    return colors
+# trick for making local package imports work
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), ".."))
+
+from colorops import COLOR_EXTRACTORS
+from colorops import extract_colors as extract_dominant_colors
+from common import FileIndex
+
+# dominant colors of each source image, per extraction method & number of colors, kept in the input directory
+PALETTE_CACHE_NAME = '.palette-cache-{method}-{num_colors}.json'
+
+def extract_colors(image, num_colors, method='minibatch'):
+    # Cluster a sample of the (downscaled) image's pixels to find the most dominant colors
+    return extract_dominant_colors(image, num_colors, method)
+
+def extract_colors_from_file(image_path, num_colors, method='minibatch'):
+    # Load the source image (BGR), None if it can't be decoded
+    source_image = cv2.imread(image_path)
+    if source_image is None:
+        return None
+    return extract_colors(source_image, num_colors, method).tolist()
+
+def get_palettes(input_dir, num_colors, method='minibatch', workers=None):
+    # Colors of all source images, only images that are new or changed since the last run are processed (in a pool of workers)
+    index = FileIndex(input_dir, PALETTE_CACHE_NAME.format(method=method, num_colors=num_colors),
+                      functools.partial(extract_colors_from_file, num_colors=num_colors, method=method),
+                      include=lambda filename: filename.endswith(('jpg', 'png', 'jpeg')))
+    return index.update(workers)
 
 def create_gradient(colors, output_dimensions):
     # Randomly shuffle the colors to create variance in the proportions of the colors
     shuffle(colors)
+    width, height = output_dimensions
     # Create an array that goes from 0 to 1 with as many steps as there are colors
     indices = np.linspace(0, 1, len(colors))
-    # Create a function that will generate the gradient along one axis
-    gradient_func = lambda x: np.array([np.interp(x, indices, colors[:, i]) for i in range(3)])
-    gradient_func = np.vectorize(gradient_func, signature='()->(n)')
-    # Create the gradient image
-    gradient = gradient_func(np.linspace(0, 1, output_dimensions[1])).astype(int)
-    gradient = np.repeat(gradient[np.newaxis, :], output_dimensions[0], axis=0)
-    return np.rot90(gradient)
+    # The gradient runs from the bottom (first color) to the top, interpolate a single column of it
+    ramp = np.linspace(0, 1, height)[::-1]
+    column = np.stack([np.interp(ramp, indices, colors[:, i]) for i in range(3)], axis=-1).astype(np.uint8)
+    # Create the gradient image, a (height, width, 3) view of that column
+    return np.broadcast_to(column[:, np.newaxis, :], (height, width, 3))
 
-def create_images(input_dir, output_dir, num_colors, num_images, output_dimensions):
-    # Get all files in the input directory
-    files = os.listdir(input_dir)
-    # Filter out non-image files
-    images = [file for file in files if file.endswith(('jpg', 'png', 'jpeg'))]
+def create_images(input_dir, output_dir, num_colors, num_images, output_dimensions, method='minibatch', workers=None):
+    # Extract the colors from the source images
+    print("extracting colors")
+    palettes = get_palettes(input_dir, num_colors, method, workers)
 
-    for image_file in tqdm.tqdm(images, desc="generating images"):
-        # Load the source image
-        source_image = cv2.imread(os.path.join(input_dir, image_file))
+    for image_file, colors in tqdm.tqdm(palettes.items(), desc="generating images"):
+        if colors is None:
+            continue
+        colors = np.array(colors)
         image_basename, ext = os.path.splitext(image_file)
-        # Extract the colors from the source image
-        colors = extract_colors(source_image, num_colors)
 
         for i in range(num_images):
             # Create a gradient image
@@ -59,10 +75,12 @@ if __name__ == "__main__":
     parser.add_argument('-c', '--num_colors', type=int, default=5, help='Number of colors per gradient')
     parser.add_argument('-n', '--num_images', type=int, default=5, help='Number of variations to create')
     parser.add_argument('--output_dimensions', type=int, nargs=2, default=[3840, 2160], help='Output image dimensions')
+    parser.add_argument('-m', '--method', type=str, choices=COLOR_EXTRACTORS, default='minibatch', help='Color extraction method')
+    parser.add_argument('-w', '--workers', type=int, default=0, help='Number of color extraction processes (0 = all cores)')
     args = parser.parse_args()
 
     # Create the output directory if it doesn't exist
     os.makedirs(args.output_dir, exist_ok=True)
 
     # Generate gradient images
-    create_images(args.input_dir, args.output_dir, args.num_colors, args.num_images, args.output_dimensions)
+    create_images(args.input_dir, args.output_dir, args.num_colors, args.num_images, args.output_dimensions, args.method, args.workers or None)
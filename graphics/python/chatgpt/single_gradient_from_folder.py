@@ -1,37 +1,37 @@
 #!/usr/local/bin/python3
 
 import os
+import sys
 import random
 import argparse
 from PIL import Image
 
+# trick for making local package imports work
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), ".."))
+
+from common import FileIndex
+from frames import gradient_frame
+
+DIRECTION_ANGLES = {'horizontal': 0, 'vertical': 90}
+
+# colors of the swatches in the input folder, by name, mtime and size
+PALETTE_INDEX_NAME = '.palette-index.json'
+
+def get_swatch_color(image_path):
+    """The color of a single-color image (its top left pixel)."""
+    with Image.open(image_path) as image:
+        return image.getpixel((0, 0))
+
 def get_palette_from_images(folder):
-    """Extract the color palette from the images in a folder."""
-    palette = []
-    for filename in os.listdir(folder):
-        if not filename.endswith(('jpg', 'png', 'jpeg')):
-            continue
-        image_path = os.path.join(folder, filename)
-        image = Image.open(image_path)
-        color = image.getpixel((0, 0))
-        palette.append(color)
-    return palette
+    """Extract the color palette from the images in a folder (through an index file, so only new / changed images are opened)."""
+    index = FileIndex(folder, PALETTE_INDEX_NAME, get_swatch_color, include=lambda filename: filename.endswith(('jpg', 'png', 'jpeg')))
+    return [tuple(color) if isinstance(color, list) else color for color in index.update().values()]
 
-def generate_gradient(colors, width, height, direction):
-    """Generate a gradient image given a list of colors, size, and direction."""
-    base = Image.new('RGB', (width, height), colors[0])
-    top = Image.new('RGB', (width, height), colors[-1])
-    mask = Image.new('L', (width, height))
-    mask_data = []
-    for y in range(height):
-        for x in range(width):
-            if direction == 'horizontal':
-                mask_data.append(int(255 * (x / width)))
-            else:  # vertical
-                mask_data.append(int(255 * (y / height)))
-    mask.putdata(mask_data)
-    base.paste(top, (0, 0), mask)
-    return base
+def generate_gradient(colors, width, height, direction, angle=None):
+    """Generate a gradient image given a list of colors (evenly spaced stops), size, and direction (or angle, in degrees)."""
+    if angle is None:
+        angle = DIRECTION_ANGLES[direction]
+    return gradient_frame((width, height), colors, angle)
 
 def main(args):
     # Get the color palette
@@ -53,7 +53,7 @@ def main(args):
     # Generate the gradient images
     for i in range(args.num_images):
         chosen_colors = random.sample(palette, args.colors_per_gradient)
-        image = generate_gradient(chosen_colors, args.width, args.height, args.direction)
+        image = generate_gradient(chosen_colors, args.width, args.height, args.direction, args.angle)
         image.save(os.path.join(args.output_folder, f'gradient_{last_index + i}.png'))
 
 if __name__ == '__main__':
@@ -63,6 +63,7 @@ if __name__ == '__main__':
     parser.add_argument('-n', '--num-images', type=int, default=10, help='The number of gradient images to generate.')
     parser.add_argument('-c', '--colors-per-gradient', type=int, default=2, help='The number of colors to include in each gradient.')
     parser.add_argument('--direction', type=str, default='horizontal', choices=['horizontal', 'vertical'], help='The direction of the gradient.')
+    parser.add_argument('--angle', type=float, default=None, help='The angle of the gradient in degrees (0: left to right, 90: top to bottom), overrides --direction.')
     parser.add_argument('--width', type=int, default=3840, help='The width of the generated images.')
     parser.add_argument('--height', type=int, default=2160, help='The height of the generated images.')
     args = parser.parse_args()
@@ -29,27 +29,26 @@ Algorithm:
     - if there are too many, some get left out
 """
 
+import functools
 import math
 from termcolor import colored
 
 from PIL import Image
 
+from canvas import open_strip_writer
+from common import load_thumbnail
+from common import parallel_map
+from grid import solve_dimensions
 
-DEFAULT_CANVAS_SIZE = (3000, 3000)
 
+DEFAULT_CANVAS_SIZE = (3000, 3000)
 
-def create_collage(paths, canvas_width, canvas_height, cols, rows, output):
-    #canvas_width, canvas_height = DEFAULT_CANVAS_SIZE
-    cell_width, cell_height = get_cell_size_by_canvas_and_grid(canvas_width, canvas_height, cols, rows)
 
-    new_image = Image.new('RGB', (canvas_width, canvas_height))
+def get_cell_positions(canvas_width, cell_width, cell_height):
+    "yields the top left corner of each cell, row by row"
     cursor = (0,0)
-    for path in paths:
-        # place image
-        image = Image.open(path)
-        image = image.resize((cell_width, cell_height))
-
-        new_image.paste(image, cursor)
+    while True:
+        yield cursor
 
         # move cursor
         y = cursor[1]
@@ -59,9 +58,52 @@ def create_collage(paths, canvas_width, canvas_height, cols, rows, output):
             x = 0
         cursor = (x, y)
 
+
+def create_collage(paths, canvas_width, canvas_height, cols, rows, output, workers=1, quality="exact", cache=None,
+        streaming=False):
+    #canvas_width, canvas_height = DEFAULT_CANVAS_SIZE
+    cell_width, cell_height = get_cell_size_by_canvas_and_grid(canvas_width, canvas_height, cols, rows)
+
+    # tiles are decoded & resized ahead of the paste loop (in worker processes if workers > 1)
+    tiles = parallel_map(functools.partial(load_thumbnail, size=(cell_width, cell_height), quality=quality, cache=cache), paths, workers)
+    positions = get_cell_positions(canvas_width, cell_width, cell_height)
+
+    if streaming:
+        write_collage_strips(tiles, positions, canvas_width, canvas_height, cell_height, output)
+        return
+
+    new_image = Image.new('RGB', (canvas_width, canvas_height))
+    for image, cursor in zip(tiles, positions):
+        # place image
+        new_image.paste(image, cursor)
+
     new_image.save(output, "PNG")
 
 
+def write_collage_strips(tiles, positions, canvas_width, canvas_height, cell_height, output):
+    """
+    same layout as create_collage, but only one row of cells is held in memory at a time
+    each row is written to the output (PNG, or TIFF by extension) as soon as it's complete
+    """
+    with open_strip_writer(output, (canvas_width, canvas_height)) as writer:
+        strip = None
+        strip_y = 0
+        for image, (x, y) in zip(tiles, positions):
+            if y >= canvas_height:
+                break
+
+            if strip is None or y != strip_y:
+                if strip is not None:
+                    writer.write(strip)
+                strip = Image.new('RGB', (canvas_width, min(cell_height, canvas_height - y)))
+                strip_y = y
+
+            strip.paste(image, (x, 0))
+
+        if strip is not None:
+            writer.write(strip)
+
+
 
 # DIMENSIONS #
 
@@ -135,22 +177,18 @@ def color_wh_per_n(h, w, n, minimum=None, auto_choose=None):
     else:
         return colored(num_str, "red")
 
-def print_table_of_dimension_options(n, ratio, pad=1, minimum=None):
+def print_table_of_dimension_options(n, ratio, pad=1, minimum=None, auto_choose=None):
     w, h = get_wh_by_nr(n, ratio)
 
     print(" ", *(f"{i:5}" for i in range(1, math.ceil(w) + pad))) # heading
     for row in range(1, math.ceil(h) + pad):
-        print(row, *(color_wh_per_n(row, col, n, minimum) for col in range(1, math.ceil(w) + pad)))
+        print(row, *(color_wh_per_n(row, col, n, minimum, auto_choose) for col in range(1, math.ceil(w) + pad)))
 
 def print_table_of_dimension_options_highlight_best(n, ratio, pad=1):
-    w, h = get_wh_by_nr(n, ratio)
-
-    options = []
-    for i in range(math.ceil(h) + pad):
-        for j in range(math.ceil(w) + pad):
-            if i*j >= n:
-                options.append(i*j)
+    "blue: fewest cells that fit n, yellow: best layout by the dimension solver (see grid)"
+    layouts = solve_dimensions(n, ratio)
 
-    minimum = sorted(options)[0]
-    print_table_of_dimension_options(n, ratio, pad, minimum)
+    minimum = min(l.cols * l.rows for l in layouts)
+    best = layouts[0].cols * layouts[0].rows
+    print_table_of_dimension_options(n, ratio, pad, minimum, best)
 
@@ -0,0 +1,162 @@
+"""
+Vectorized color operations on batches of tiles
+
+Tiles are numpy arrays of shape (..., h, w, 3), uint8 RGB.
+HSV planes are float32: hue in [0, 1), saturation in [0, 1], value in [0, 255].
+
+The HSV planes of a source tile are computed once (to_hsv), after which any number of
+recolored variants can be produced from them in a single numpy pass (colorize_batch).
+
+Dominant colors (extract_colors) are found on a sample of the image's pixels, not all of them:
+the image is downscaled to at most EXTRACTION_SIZE px on the long side, then at most
+EXTRACTION_SAMPLES pixels are drawn from it. Backends:
+- kmeans:       sklearn's KMeans
+- minibatch:    sklearn's MiniBatchKMeans (default)
+- median-cut:   PIL's median cut quantizer, no sklearn needed
+sklearn is only imported when one of its backends is used.
+Extraction is channel order agnostic, colors come back in the image's own order (e.g. BGR for cv2).
+"""
+
+import numpy as np
+from PIL import Image
+
+
+# for each hue sector (0-5), which of the (v, p, q, t) planes become r, g & b
+HUE_SECTORS = np.array([
+    [0, 3, 1],
+    [2, 0, 1],
+    [1, 0, 3],
+    [1, 2, 0],
+    [3, 1, 0],
+    [0, 1, 2],
+])
+
+# ITU-R 601-2 luma, same fixed point weights PIL uses for convert("L")
+LUMA_WEIGHTS = (19595, 38470, 7471)
+
+COLOR_EXTRACTORS = ("kmeans", "minibatch", "median-cut")
+
+# dominant colors are extracted from a downscaled copy, and at most this many of its pixels
+EXTRACTION_SIZE = 512
+EXTRACTION_SAMPLES = 65536
+
+
+def to_hsv(rgb):
+    "uint8 RGB (..., 3) -> float32 HSV (..., 3), alpha (if any) is dropped"
+    rgb = np.asarray(rgb)[..., :3].astype(np.float32)
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+
+    maxc = rgb.max(axis=-1)
+    minc = rgb.min(axis=-1)
+    delta = maxc - minc
+
+    hsv = np.empty_like(rgb)
+    hsv[..., 2] = maxc
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        hsv[..., 1] = np.where(delta > 0, delta / maxc, 0)
+
+        rc = (maxc - r) / delta
+        gc = (maxc - g) / delta
+        bc = (maxc - b) / delta
+
+    h = np.where(r == maxc, bc - gc, np.where(g == maxc, 2.0 + rc - bc, 4.0 + gc - rc))
+    hsv[..., 0] = np.where(delta > 0, (h / 6.0) % 1.0, 0)
+
+    return hsv
+
+
+def enhance_color(rgb, factor):
+    """
+    numpy version of PIL's ImageEnhance.Color(image).enhance(factor):
+    blends each pixel with its own grayscale value (factor 0 = grayscale, 1 = unchanged, >1 = more saturated)
+    """
+    rgb = np.asarray(rgb)
+    wr, wg, wb = LUMA_WEIGHTS
+    gray = (rgb[..., 0].astype(np.int32) * wr + rgb[..., 1].astype(np.int32) * wg + rgb[..., 2].astype(np.int32) * wb + 0x8000) >> 16
+    gray = gray[..., np.newaxis].astype(np.float32)
+
+    out = gray + np.float32(factor) * (rgb - gray)
+    return np.clip(out, 0, 255).astype(np.uint8)
+
+
+def colorize_batch(hsv, hues, sources=None, saturation=1.0, chunk_size=256):
+    """
+    recolor many tiles at once: each output tile takes the saturation & value planes of a source tile
+    and a single hue, then gets its color enhanced by `saturation` (see enhance_color)
+
+    hsv:        float32 (k, h, w, 3) HSV planes of the source tiles (from to_hsv)
+    hues:       (n,) hue per output tile, in [0, 1]
+    sources:    (n,) index into hsv per output tile (default: output tile i uses source i)
+    returns     uint8 (n, h, w, 3)
+    """
+    hues = np.asarray(hues, dtype=np.float32)
+    if sources is None:
+        sources = np.arange(len(hues))
+    sources = np.asarray(sources)
+
+    out = np.empty((len(hues),) + hsv.shape[1:3] + (3,), dtype=np.uint8)
+
+    # chunked to keep the float32 temporaries small
+    for start in range(0, len(hues), chunk_size):
+        end = start + chunk_size
+        h = hues[start:end, np.newaxis, np.newaxis]
+        s = hsv[sources[start:end], ..., 1]
+        v = hsv[sources[start:end], ..., 2]
+
+        # the hue (and so the sector) is constant per tile
+        sector = (h * 6.0).astype(np.uint8)
+        f = (h * 6.0) - sector
+        sector = sector[:, 0, 0] % 6
+
+        planes = np.stack((v, v * (1.0 - s), v * (1.0 - s * f), v * (1.0 - s * (1.0 - f))))
+        idx = HUE_SECTORS[sector].T[..., np.newaxis, np.newaxis]
+        rgb = np.moveaxis(np.take_along_axis(planes, idx, axis=0), 0, -1).astype(np.uint8)
+
+        out[start:end] = rgb if saturation == 1.0 else enhance_color(rgb, saturation)
+
+    return out
+
+
+def sample_pixels(image, max_size=EXTRACTION_SIZE, max_samples=EXTRACTION_SAMPLES, seed=0):
+    "uint8 (h, w, 3+) image -> (n, 3) float32 pixels of a downscaled copy, at most max_samples of them (random, reproducible)"
+    image = np.asarray(image)[..., :3]
+    h, w = image.shape[:2]
+    scale = max_size / max(h, w)
+    if scale < 1:
+        size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        image = np.asarray(Image.fromarray(np.ascontiguousarray(image)).resize(size, Image.Resampling.BOX))
+
+    pixels = image.reshape(-1, 3)
+    if len(pixels) > max_samples:
+        pixels = pixels[np.random.default_rng(seed).choice(len(pixels), max_samples, replace=False)]
+    return pixels.astype(np.float32)
+
+
+def median_cut(pixels, num_colors):
+    "(n, 3) pixels -> (k <= num_colors, 3) float32 colors (PIL's median cut)"
+    strip = Image.fromarray(np.asarray(pixels, dtype=np.uint8)[np.newaxis])
+    quantized = strip.quantize(num_colors, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
+    num_found = len(quantized.getcolors())
+    return np.array(quantized.getpalette()[:num_found * 3], dtype=np.float32).reshape(-1, 3)
+
+
+def extract_colors(image, num_colors, method="minibatch", max_size=EXTRACTION_SIZE, max_samples=EXTRACTION_SAMPLES, seed=0):
+    """
+    uint8 (h, w, 3) image -> (num_colors, 3) float32 dominant colors (fewer, for images with fewer distinct colors
+    and median-cut), see module docs for the sampling & backends
+    """
+    pixels = sample_pixels(image, max_size, max_samples, seed)
+
+    if method == "median-cut":
+        return median_cut(pixels, num_colors)
+    elif method == "kmeans":
+        from sklearn.cluster import KMeans
+        model = KMeans(n_clusters=num_colors, n_init="auto", random_state=seed)
+    elif method == "minibatch":
+        from sklearn.cluster import MiniBatchKMeans
+        model = MiniBatchKMeans(n_clusters=num_colors, n_init="auto", random_state=seed)
+    else:
+        raise ValueError("unknown color extraction method %r (one of %s)" % (method, ", ".join(COLOR_EXTRACTORS)))
+
+    return model.fit(pixels).cluster_centers_.astype(np.float32)
@@ -1,7 +1,15 @@
 import argparse
+import collections
 import glob
+import hashlib
+import json
 import os
 import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
 
 
 IMG_EXTS = ["PNG", "JPG", "JPEG"]
@@ -22,6 +30,17 @@ CANVAS_SIZES = {
     "hs":                   (10000, 10000),
 }
 
+# decode quality presets, mapped to the reducing_gap used for Image.draft() / Image.resize()
+# None means a full decode followed by a plain resize (slowest, reference quality)
+DECODE_QUALITIES = {
+    "exact":    None,
+    "balanced": 3.0,
+    "fast":     1.5,
+}
+
+THUMBNAIL_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pichefkes", "thumbnails")
+THUMBNAIL_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
 
 def get_image_files_by_folder(folder):
     if not os.path.isdir(folder):
@@ -62,3 +81,205 @@ def get_canvas_presets():
     return res
 
 
+def get_median_image_ratio(paths):
+    "median h/w of the images (only their headers are read), None if none of them can be opened"
+    ratios = []
+    for path in paths:
+        try:
+            with Image.open(path) as image:
+                ratios.append(image.height / image.width)
+        except OSError:
+            continue
+    if not ratios:
+        return None
+    ratios.sort()
+    return ratios[len(ratios) // 2]
+
+
+def open_image_resized(path, size, quality="exact", resample=None):
+    """
+    open an image and resize it to size (w, h)
+    for quality other than "exact", JPEGs are decoded at reduced resolution (DCT scaling via draft())
+    and other formats are downscaled in two stages (reduce() by an integer factor, then resize())
+    """
+    image = Image.open(path)
+    reducing_gap = DECODE_QUALITIES[quality]
+
+    if reducing_gap:
+        image.draft(None, (int(size[0] * reducing_gap), int(size[1] * reducing_gap)))
+
+    return image.resize(size, resample=resample, reducing_gap=reducing_gap)
+
+
+class ThumbnailCache:
+    """
+    on-disk cache of resized images, keyed by (path, mtime, file size, target size, resample, quality)
+    entries are stored as lossless PNGs, so a cache hit gives the exact same pixels as a fresh decode
+    least recently used entries are evicted once the cache grows beyond max_bytes
+    """
+
+    def __init__(self, folder=THUMBNAIL_CACHE_DIR, max_bytes=THUMBNAIL_CACHE_MAX_BYTES):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._total_bytes = None
+
+        os.makedirs(self.folder, exist_ok=True)
+
+    def get_entry_path(self, path, size, resample=None, quality="exact"):
+        st = os.stat(path)
+        key = repr((os.path.realpath(path), st.st_mtime_ns, st.st_size, tuple(size), resample, quality))
+        return os.path.join(self.folder, hashlib.sha1(key.encode()).hexdigest() + ".png")
+
+    def get(self, path, size, resample=None, quality="exact"):
+        entry = self.get_entry_path(path, size, resample, quality)
+        try:
+            image = Image.open(entry)
+            image.load()
+        except OSError:
+            return None
+
+        # mark as recently used
+        os.utime(entry)
+        return image
+
+    def put(self, path, size, image, resample=None, quality="exact"):
+        entry = self.get_entry_path(path, size, resample, quality)
+        tmp = "%s.%d.tmp" % (entry, os.getpid())
+        try:
+            image.save(tmp, "PNG")
+        except OSError:
+            # mode can't be stored as PNG (e.g. CMYK), just don't cache it
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+
+        os.replace(tmp, entry)
+
+        if self._total_bytes is None:
+            self._total_bytes = sum(e.stat().st_size for e in self._get_entries())
+        else:
+            self._total_bytes += os.path.getsize(entry)
+
+        if self._total_bytes > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        # drop least recently used entries until we're 10% below the budget
+        entries = sorted(self._get_entries(), key=lambda e: e.stat().st_mtime)
+        total = sum(e.stat().st_size for e in entries)
+        target = self.max_bytes * 0.9
+
+        for e in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(e.path)
+            except FileNotFoundError:
+                pass
+            total -= e.stat().st_size
+
+        self._total_bytes = total
+
+    def _get_entries(self):
+        return [e for e in os.scandir(self.folder) if e.name.endswith(".png")]
+
+
+class FileIndex:
+    """
+    a value per file of a folder (e.g. a color per swatch), kept in a json file (name) in that folder
+    values are only computed (compute(path) -> json-able value) for files that are new or changed since the
+    last update (by mtime & file size), entries of files that are gone are dropped, so a warm index costs
+    a directory listing and a single read
+    """
+
+    def __init__(self, folder, name, compute, include=None):
+        self.folder = folder
+        self.path = os.path.join(folder, name)
+        self.compute = compute
+        self.include = include
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}  # missing or unreadable, start over
+
+    def _save(self, entries):
+        tmp = "%s.%d.tmp" % (self.path, os.getpid())
+        with open(tmp, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp, self.path)
+
+    def update(self, workers=1):
+        """
+        -> {filename: value} for the folder's files (those include(filename) accepts), in directory order
+        new / changed files are computed in a pool of worker processes (see parallel_map, compute must be picklable)
+        """
+        old_entries = self._load()
+        entries = {}
+        stale = []
+
+        for e in os.scandir(self.folder):
+            if e.name == os.path.basename(self.path) or not e.is_file():
+                continue
+            if self.include and not self.include(e.name):
+                continue
+
+            st = e.stat()
+            entry = old_entries.get(e.name)
+            if not entry or entry["mtime"] != st.st_mtime_ns or entry["size"] != st.st_size:
+                entry = {"mtime": st.st_mtime_ns, "size": st.st_size, "value": None}
+                stale.append((e.name, e.path))
+            entries[e.name] = entry
+
+        values = parallel_map(self.compute, [path for _, path in stale], workers)
+        for (name, _), value in zip(stale, values):
+            entries[name]["value"] = value
+
+        if stale or entries.keys() != old_entries.keys():
+            self._save(entries)
+
+        return {name: entry["value"] for name, entry in entries.items()}
+
+
+def load_thumbnail(path, size, quality="exact", resample=None, cache=None):
+    "same as open_image_resized(), but goes through a ThumbnailCache if one is given"
+    if cache is None:
+        return open_image_resized(path, size, quality, resample)
+
+    image = cache.get(path, size, resample, quality)
+    if image is None:
+        image = open_image_resized(path, size, quality, resample)
+        cache.put(path, size, image, resample, quality)
+
+    return image
+
+
+def parallel_map(func, items, workers=None, prefetch=2, initializer=None, initargs=(), threads=False):
+    """
+    like map(func, items), but func runs in a pool of worker processes (or threads, if threads=True)
+    at most (workers * prefetch) items are in flight at any time, results are yielded in input order
+    workers=None uses all cores, workers<=1 runs serially in the current process
+    initializer(*initargs) runs once per worker (or once, when serial), e.g. to hand over big shared inputs
+    threads suit funcs that spend their time in code that releases the GIL (numpy, cv2, PIL), and skip pickling
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers <= 1:
+        if initializer:
+            initializer(*initargs)
+        yield from map(func, items)
+        return
+
+    pool = ThreadPoolExecutor if threads else ProcessPoolExecutor
+    with pool(max_workers=workers, initializer=initializer, initargs=initargs) as executor:
+        pending = collections.deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= workers * prefetch:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,283 @@
+"""
+Mosaic data from (possibly huge) files
+
+Input files are memory-mapped rather than read, so they never have to fit in memory,
+and files with more bytes than cells can be reduced to one statistic per block of bytes
+(mean byte value / Shannon entropy), computed chunk by chunk in constant memory.
+
+Analyses (what each cell shows):
+- bytes:        raw byte values
+- entropy:      Shannon entropy of a window sliding over the file
+- byte-class:   class of each byte (null, control, whitespace, printable, high, 0xFF)
+
+Layouts (where each cell goes):
+- rows:         left to right, top to bottom
+- hilbert:      along a Hilbert curve, so bytes that are close in the file stay close in the image
+"""
+
+import math
+
+import numpy as np
+
+
+BLOCK_STATS = ("mean", "entropy")
+ANALYSES = ("bytes", "entropy", "byte-class")
+LAYOUTS = ("rows", "hilbert")
+
+BYTE_CLASSES = ("null", "control", "whitespace", "printable", "high", "0xff")
+
+# byte value -> index in BYTE_CLASSES
+BYTE_CLASS_LUT = np.full(256, BYTE_CLASSES.index("control"), dtype=np.uint8)
+BYTE_CLASS_LUT[0x00] = BYTE_CLASSES.index("null")
+BYTE_CLASS_LUT[[0x09, 0x0A, 0x0D, 0x20]] = BYTE_CLASSES.index("whitespace")
+BYTE_CLASS_LUT[0x21:0x7F] = BYTE_CLASSES.index("printable")
+BYTE_CLASS_LUT[0x80:0xFF] = BYTE_CLASSES.index("high")
+BYTE_CLASS_LUT[0xFF] = BYTE_CLASSES.index("0xff")
+
+# bytes (or histogram bins, whichever is more) processed per step when reducing blocks
+CHUNK_BYTES = 4 * 1024 ** 2
+
+DEFAULT_MAX_CELLS = 2 ** 24
+
+
+def open_file_data(path):
+    "memory-maps a file as a read-only uint8 array"
+    try:
+        return np.memmap(path, dtype=np.uint8, mode="r")
+    except ValueError:
+        raise ValueError("cannot make a mosaic from an empty file: %s" % path)
+
+
+def get_block_size(num_bytes, max_cells):
+    "smallest block size (in bytes) that fits num_bytes into at most max_cells blocks"
+    if not max_cells or num_bytes <= max_cells:
+        return 1
+    return math.ceil(num_bytes / max_cells)
+
+
+def get_entropy(counts, totals):
+    "Shannon entropy (bits, 0-8) per row of byte value counts (n, 256)"
+    # H = log2(N) - sum(c * log2(c)) / N
+    counts = counts.astype(np.float32)
+    logs = np.zeros_like(counts)
+    np.log2(counts, out=logs, where=counts > 0)
+    return np.log2(totals) - (counts * logs).sum(axis=1) / totals
+
+
+def get_byte_counts(blocks):
+    "byte value histogram per row of blocks (n, block_size) -> (n, 256)"
+    n = blocks.shape[0]
+    offsets = np.arange(n, dtype=np.int64)[:, np.newaxis] * 256
+    return np.bincount((offsets + blocks).ravel(), minlength=n * 256).reshape(n, 256)
+
+
+def _reduce_blocks(blocks, stat):
+    if stat == "mean":
+        return blocks.mean(axis=1)
+    elif stat == "entropy":
+        return get_entropy(get_byte_counts(blocks), np.full(blocks.shape[0], blocks.shape[1]))
+    elif stat == "byte-class":
+        # most common class in the block
+        classes = BYTE_CLASS_LUT[blocks]
+        n = classes.shape[0]
+        offsets = np.arange(n, dtype=np.int64)[:, np.newaxis] * len(BYTE_CLASSES)
+        counts = np.bincount((offsets + classes).ravel(), minlength=n * len(BYTE_CLASSES)).reshape(n, len(BYTE_CLASSES))
+        return counts.argmax(axis=1)
+    raise ValueError("stat must be one of: " + ", ".join(BLOCK_STATS + ("byte-class",)))
+
+
+def reduce_blocks(data, block_size, stat="mean"):
+    """
+    one value (float32) per block_size bytes of data, the last block may be partial
+    data is walked through in chunks of about CHUNK_BYTES, so memory use doesn't depend on its size
+    """
+    num_blocks = math.ceil(len(data) / block_size)
+    out = np.empty(num_blocks, dtype=np.float32)
+
+    # entropy needs a 256 bin histogram per block, so small blocks are budgeted by bins rather than bytes
+    blocks_per_chunk = max(1, CHUNK_BYTES // (max(block_size, 256) if stat == "entropy" else block_size))
+    for first in range(0, num_blocks, blocks_per_chunk):
+        last = min(first + blocks_per_chunk, num_blocks)
+        chunk = np.asarray(data[first * block_size:last * block_size])
+
+        full = len(chunk) // block_size
+        if full:
+            out[first:first + full] = _reduce_blocks(chunk[:full * block_size].reshape(full, block_size), stat)
+        if full < last - first:
+            out[first + full] = _reduce_blocks(chunk[full * block_size:].reshape(1, -1), stat)[0]
+
+    return out
+
+
+def sliding_entropy(data, window=256, step=None):
+    """
+    Shannon entropy of every `window` bytes, starting every `step` bytes (window must be a multiple of step)
+    byte histograms are counted once per step, and each window's histogram is a difference of their
+    running sums, so overlapping windows cost no more than non-overlapping ones
+    """
+    step = step or window
+    if window % step:
+        raise ValueError("window (%d) must be a multiple of step (%d)" % (window, step))
+    k = window // step
+
+    num_steps = math.ceil(len(data) / step)
+    num_windows = max(1, num_steps - k + 1)
+    out = np.empty(num_windows, dtype=np.float32)
+
+    # histograms of the last k-1 steps of the previous chunk, for windows spanning two chunks
+    carry = np.zeros((0, 256), dtype=np.int64)
+    written = 0
+
+    steps_per_chunk = max(k, CHUNK_BYTES // max(step, 256))
+    for first in range(0, num_steps, steps_per_chunk):
+        last = min(first + steps_per_chunk, num_steps)
+        chunk = np.asarray(data[first * step:last * step])
+
+        full = len(chunk) // step
+        counts = get_byte_counts(chunk[:full * step].reshape(full, step))
+        if full < last - first:
+            counts = np.concatenate((counts, get_byte_counts(chunk[full * step:].reshape(1, -1))))
+        counts = np.concatenate((carry, counts))
+
+        if len(counts) >= k:
+            running = np.concatenate((np.zeros((1, 256), dtype=np.int64), np.cumsum(counts, axis=0)))
+            windows = running[k:] - running[:-k]
+            out[written:written + len(windows)] = get_entropy(windows, windows.sum(axis=1))
+            written += len(windows)
+
+        carry = counts[max(0, len(counts) - (k - 1)):] if k > 1 else counts[:0]
+
+    if written == 0:
+        # file is shorter than a single window
+        out[0] = get_entropy(carry.sum(axis=0, keepdims=True), np.array([len(data)]))[0]
+
+    return out
+
+
+def analyze(data, analysis="bytes", max_cells=DEFAULT_MAX_CELLS, block_stat="mean", window=256, step=None):
+    """
+    file data -> one value per cell, at most max_cells of them (if max_cells is set)
+    for bytes & byte-class, blocks of bytes are reduced to one value (block_stat / most common class),
+    for entropy, the step is widened instead
+    """
+    if analysis == "bytes":
+        block_size = get_block_size(len(data), max_cells)
+        if block_size == 1:
+            return data
+        print("%d bytes -> %d byte blocks (%s)" % (len(data), block_size, block_stat))
+        return reduce_blocks(data, block_size, block_stat)
+
+    elif analysis == "byte-class":
+        block_size = get_block_size(len(data), max_cells)
+        if block_size == 1:
+            return BYTE_CLASS_LUT[data]
+        print("%d bytes -> %d byte blocks (most common class)" % (len(data), block_size))
+        return reduce_blocks(data, block_size, "byte-class").astype(np.uint8)
+
+    elif analysis == "entropy":
+        step = step or window
+        min_step = get_block_size(len(data), max_cells)
+        if step < min_step:
+            # keep the same window / step ratio where possible
+            ratio = max(1, window // step)
+            step = min_step
+            window = step * ratio
+            print("%d bytes -> window %d, step %d" % (len(data), window, step))
+        if window % step:
+            window = math.ceil(window / step) * step
+        return sliding_entropy(data, window, step)
+
+    raise ValueError("analysis must be one of: " + ", ".join(ANALYSES))
+
+
+def hilbert_d2xy(order, d):
+    "positions along a Hilbert curve (array) -> (x, y) arrays, on a 2**order x 2**order grid"
+    d = np.asarray(d, dtype=np.int64)
+    x = np.zeros_like(d)
+    y = np.zeros_like(d)
+
+    t = d.copy()
+    s = 1
+    while s < (1 << order):
+        rx = 1 & (t // 2)
+        ry = 1 & (t ^ rx)
+
+        # rotate the quadrant
+        flip = (ry == 0) & (rx == 1)
+        x = np.where(flip, s - 1 - x, x)
+        y = np.where(flip, s - 1 - y, y)
+        swap = (ry == 0)
+        x, y = np.where(swap, y, x), np.where(swap, x, y)
+
+        x += s * rx
+        y += s * ry
+        t //= 4
+        s *= 2
+
+    return x, y
+
+
+def to_hilbert_grid(values, chunk=CHUNK_BYTES):
+    "lays values out along a Hilbert curve on the smallest 2**k x 2**k grid that fits them, zero padded"
+    order = max(0, math.ceil(math.log2(max(1, len(values))) / 2))
+    side = 1 << order
+    grid = np.zeros((side, side), dtype=values.dtype)
+
+    for first in range(0, len(values), chunk):
+        last = min(first + chunk, len(values))
+        x, y = hilbert_d2xy(order, np.arange(first, last))
+        grid[y, x] = values[first:last]
+
+    return grid
+
+
+class PaddedGrid:
+    """
+    values laid out row by row in a rows x cols grid, with the cells past the end reading as 0,
+    without copying values into a padded array (so a memory-mapped file stays on disk)
+    supports what mosaic's numpy renderer needs: shape, value_range() and indexing with (row indices, col indices) arrays,
+    which only reads the indexed cells; anything else goes through np.asarray, which does build the whole grid
+    """
+    ndim = 2
+
+    def __init__(self, values, rows, cols):
+        self.values = values
+        self.shape = (rows, cols)
+        self.dtype = values.dtype
+
+    @property
+    def size(self):
+        return self.shape[0] * self.shape[1]
+
+    def value_range(self):
+        "(min, max) of the cells, NaNs ignored"
+        return min(np.nanmin(self.values), 0), max(np.nanmax(self.values), 0)
+
+    def __getitem__(self, key):
+        rows, cols = np.broadcast_arrays(*key)
+        flat = rows.astype(np.int64) * self.shape[1] + cols
+        inside = flat < len(self.values)
+
+        out = np.zeros(flat.shape, dtype=self.dtype)
+        out[inside] = self.values[flat[inside]]
+        return out
+
+    def __array__(self, dtype=None, copy=None):
+        grid = np.zeros(self.size, dtype=dtype or self.dtype)
+        grid[:len(self.values)] = self.values
+        return grid.reshape(self.shape)
+
+
+def to_grid(values, rows, cols):
+    """
+    lays values out row by row in a rows x cols grid, zero padded at the end
+    when values fill the grid exactly this is a view, otherwise a PaddedGrid, neither copies values
+    (even for a memory-mapped file)
+    """
+    ncells = rows * cols
+    if len(values) > ncells:
+        raise ValueError("%d values don't fit in a %d x %d grid" % (len(values), rows, cols))
+
+    if len(values) == ncells:
+        return values.reshape((rows, cols))
+    return PaddedGrid(values, rows, cols)
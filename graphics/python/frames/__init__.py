@@ -0,0 +1,320 @@
+"""
+Frame generation for the series scripts
+
+Frames are built in one go, never pixel by pixel:
+- solid frames:     Image.new with the fill color
+- gradient frames:  a ramp of blend factors (any angle, any number of color stops), broadcast against
+                    the colors with numpy
+
+Colors are (r, g, b) tuples, 0-255; fractional channels are truncated, like int() does.
+
+Frames are written through a sink:
+- PNGSink:      PNG files, encoded in a pool of worker processes
+- VideoSink:    a single video, raw frames piped into ffmpeg (plus a list of the frames' names, in video order)
+- TeeSink:      several of the above at once, e.g. a video and a PNG dump
+
+Usage:
+
+with PNGSink(workers=4, compress_level=1) as sink:
+    for i, color in enumerate(colors):
+        sink.write(solid_frame(size, color), "%05d.png" % i)
+"""
+
+import collections
+import colorsys
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+from PIL import ImageColor
+
+
+# colors precomputed for gradients that aren't axis aligned
+GRADIENT_LUT_SIZE = 4096
+
+# same as PIL's default
+DEFAULT_COMPRESS_LEVEL = 6
+
+DEFAULT_FPS = 25
+DEFAULT_VIDEO_CODEC = "libx264"
+VIDEO_EXT = ".mp4"
+FRAME_LIST_EXT = ".frames.txt"
+
+
+def to_rgb8(color):
+    "(r, g, b) floats in 0-255 -> int tuple (truncated)"
+    return tuple(int(c) for c in color)
+
+
+def hsv_to_rgb8(hue, saturation, value):
+    "hsv (0-1 each) -> (r, g, b) 0-255 ints"
+    return to_rgb8(c * 255 for c in colorsys.hsv_to_rgb(hue, saturation, value))
+
+
+def interpolate_color(color1, color2, factor):
+    return tuple(np.array(color1) * (1 - factor) + np.array(color2) * factor)
+
+
+def solid_frame(size, color):
+    "(width, height), color -> RGB image filled with color"
+    return Image.new("RGB", tuple(size), to_rgb8(color))
+
+
+def parse_color(color):
+    "color name / hex string / gray level / (r, g, b[, a]) -> (r, g, b)"
+    if isinstance(color, str):
+        return ImageColor.getrgb(color)[:3]
+    if isinstance(color, (int, float)):
+        return (color, color, color)
+    return tuple(color[:3])
+
+
+def get_gradient_ramp(size, angle=0, scale=1.0):
+    """
+    (width, height), angle in degrees (0: left to right, 90: top to bottom) -> blend factors in [0, 1) (times scale)
+    as a float32 array that broadcasts to (height, width): (1, width) / (height, 1) for axis aligned angles,
+    (height, width) otherwise
+    """
+    width, height = size
+    a = np.deg2rad(angle % 360)
+    dx, dy = np.cos(a), np.sin(a)
+    if abs(dx) < 1e-9:
+        dx = 0.0
+    if abs(dy) < 1e-9:
+        dy = 0.0
+
+    # the gradient spans the whole frame (corner to corner along its direction)
+    low = min(0, width * dx) + min(0, height * dy)
+    high = max(0, width * dx) + max(0, height * dy)
+    scale = scale / (high - low)
+
+    # position of each pixel along the gradient's direction, as a sum of a row and a column term
+    x = ((np.arange(width, dtype=np.float32) * dx - low) * scale)[np.newaxis, :]
+    y = (np.arange(height, dtype=np.float32) * dy * scale)[:, np.newaxis]
+
+    if dy == 0:
+        return x
+    elif dx == 0:
+        return y + np.float32(-low * scale)
+    return x + y
+
+
+def interpolate_stops(colors, t):
+    "colors (n stops, evenly spaced), blend factors t in [0, 1] (any shape) -> float32 colors of shape t.shape + (3,)"
+    stops = np.array([parse_color(c) for c in colors], dtype=np.float32)
+    if len(stops) == 1:
+        return np.broadcast_to(stops[0], t.shape + (3,))
+
+    position = np.clip(t, 0, 1) * (len(stops) - 1)
+    segment = np.minimum(position.astype(np.intp), len(stops) - 2)
+    f = (position - segment)[..., np.newaxis]
+    return stops[segment] * (1 - f) + stops[segment + 1] * f
+
+
+def gradient_frame(size, colors, angle=0, lut_size=GRADIENT_LUT_SIZE):
+    """
+    (width, height), colors (2+ stops, evenly spaced), angle in degrees (0: left to right, 90: top to bottom) -> RGB image
+    axis aligned gradients are computed for a single row / column and broadcast, others through a lookup table
+    of lut_size precomputed colors
+    """
+    width, height = size
+    ramp = get_gradient_ramp(size, angle, lut_size - 1)
+
+    if ramp.shape != (height, width):
+        line = interpolate_stops(colors, ramp / (lut_size - 1)).astype(np.uint8)
+        data = np.broadcast_to(line, (height, width, 3))
+    else:
+        lut = interpolate_stops(colors, np.linspace(0, 1, lut_size, dtype=np.float32)).astype(np.uint8)
+        data = np.take(lut, (ramp + np.float32(0.5)).astype(np.intp), axis=0)
+
+    return Image.fromarray(np.ascontiguousarray(data))
+
+
+def save_png(frame, path, compress_level=DEFAULT_COMPRESS_LEVEL):
+    frame.save(path, compress_level=compress_level)
+
+
+class PNGSink:
+    """
+    saves frames as PNGs in a pool of worker processes (workers=None: all cores, workers<=1: right away, in this process)
+    at most (workers * prefetch) frames wait to be encoded, write() blocks until there's room
+    compress_level: 0 (none, fastest) - 9 (smallest)
+    """
+    def __init__(self, workers=None, compress_level=DEFAULT_COMPRESS_LEVEL, prefetch=2):
+        self.workers = workers or os.cpu_count() or 1
+        self.compress_level = compress_level
+        self.max_pending = self.workers * prefetch
+
+        self._executor = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        self._pending = collections.deque()
+
+    def write(self, frame, path):
+        if not self._executor:
+            save_png(frame, path, self.compress_level)
+            return
+
+        while len(self._pending) >= self.max_pending:
+            self._pending.popleft().result()  # raises the worker's error, if any
+        self._pending.append(self._executor.submit(save_png, frame, path, self.compress_level))
+
+    def close(self):
+        while self._pending:
+            self._pending.popleft().result()
+        if self._executor:
+            self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class VideoSink:
+    """
+    pipes frames into ffmpeg, which encodes them into a single video
+    ffmpeg starts with the first frame: the video's size is that frame's, and without an output path
+    the video is named after it (e.g. frames/02_00001.png -> frames/02_00001.mp4)
+    frames are in the order they're written, the names they'd have had as PNGs (with their batch & index)
+    are listed in the same order, one per line, in <video name>.frames.txt in the frames' folder (even when the
+    video goes elsewhere), so list_frame_names sees them and numbering carries on from them
+    existing videos & frame lists are never overwritten, every batch needs a video of its own
+    """
+    def __init__(self, output=None, fps=DEFAULT_FPS, codec=DEFAULT_VIDEO_CODEC, ffmpeg="ffmpeg"):
+        self.output = output
+        self.fps = fps
+        self.codec = codec
+        self.ffmpeg = ffmpeg
+
+        self.size = None
+        self.closed = False
+        self.frame_list_path = None
+        self._process = None
+        self._frame_list = None
+
+    def _start(self, size, path):
+        if not self.output:
+            if not path:
+                raise ValueError("video output needs a path, or frames with names to name it after")
+            self.output = os.path.splitext(path)[0] + VIDEO_EXT
+        frames_folder = os.path.dirname(path if path else self.output)
+        self.frame_list_path = os.path.join(frames_folder, os.path.basename(self.output) + FRAME_LIST_EXT)
+
+        for existing in (self.output, self.frame_list_path):
+            if os.path.exists(existing):
+                raise FileExistsError("%s already exists (from an earlier batch?), not overwriting it" % existing)
+        self.size = tuple(size)
+
+        command = [
+            self.ffmpeg, "-n", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", "%dx%d" % self.size, "-r", str(self.fps), "-i", "-",
+            "-c:v", self.codec, "-pix_fmt", "yuv420p", self.output,
+        ]
+        try:
+            self._process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        except FileNotFoundError:
+            raise RuntimeError("ffmpeg not found (%s), it's needed for video output" % self.ffmpeg)
+        self._frame_list = open(self.frame_list_path, "x")
+
+    def write(self, frame, path=None):
+        if self.closed:
+            raise ValueError("video sink is closed (%s)" % (self.output or "not started"))
+        if self._process is None:
+            self._start(frame.size, path)
+        elif frame.size != self.size:
+            raise ValueError("frame size %dx%d differs from the video's (%dx%d)" % (frame.size + self.size))
+
+        try:
+            self._process.stdin.write(frame.convert("RGB").tobytes())
+        except BrokenPipeError:
+            self.close()  # raises ffmpeg's failure
+            raise RuntimeError("ffmpeg stopped reading frames early, writing %s" % self.output)
+        if path:
+            self._frame_list.write(os.path.basename(path) + "\n")
+
+    def close(self):
+        self.closed = True
+        if self._process is None:
+            return
+        process, self._process = self._process, None
+
+        self._frame_list.close()
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        if process.wait() != 0:
+            raise RuntimeError("ffmpeg failed (exit code %d) writing %s" % (process.returncode, self.output))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TeeSink:
+    "writes every frame to all of the given sinks"
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def write(self, frame, path=None):
+        for sink in self.sinks:
+            sink.write(frame, path)
+
+    def close(self):
+        "closes all of the sinks, even if some fail (the first failure is raised once they're all closed)"
+        error = None
+        for sink in self.sinks:
+            try:
+                sink.close()
+            except Exception as e:
+                error = error or e
+        if error:
+            raise error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def add_sink_arguments(parser):
+    "adds the frame sink options (see get_sink) to an argparse parser"
+    parser.add_argument('-w', '--workers', type=int, default=0, help="Number of PNG encoding processes (0 = all cores)")
+    parser.add_argument('-cl', '--compress_level', type=int, choices=range(10), default=DEFAULT_COMPRESS_LEVEL, metavar="{0-9}",
+                        help="PNG compression level, lower is faster but bigger")
+    parser.add_argument('--video', type=str, nargs='?', const="", default=None, metavar="PATH",
+                        help="Write the frames into a video (through ffmpeg) instead of PNGs, "
+                             "by default next to the frames, named after the first one (existing videos aren't overwritten)")
+    parser.add_argument('--fps', type=int, default=DEFAULT_FPS, help="Frame rate of the video")
+    parser.add_argument('--keep_png', action='store_true', help="With --video, write the PNGs as well")
+
+
+def get_sink(args):
+    "frame sink for the options added by add_sink_arguments"
+    if args.video is None:
+        return PNGSink(args.workers or None, args.compress_level)
+
+    video_sink = VideoSink(args.video or None, args.fps)
+    if args.keep_png:
+        return TeeSink(video_sink, PNGSink(args.workers or None, args.compress_level))
+    return video_sink
+
+
+def list_frame_names(folder):
+    """
+    names of the frames in folder: PNGs, and frames that went into videos instead (see VideoSink)
+    so batch & index numbering carries on the same way, whichever sink wrote the earlier batches
+    """
+    names = []
+    for filename in os.listdir(folder):
+        if filename.endswith(FRAME_LIST_EXT):
+            with open(os.path.join(folder, filename)) as f:
+                names.extend(line.strip() for line in f if line.strip())
+        else:
+            names.append(filename)
+    return names
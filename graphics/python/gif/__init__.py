@@ -0,0 +1,284 @@
+"""
+Streaming GIF writing
+
+Frames are encoded and written to the file as they come in, so only the current frame
+has to be held in memory, regardless of the number of frames.
+BackgroundWriter moves the encoding to a thread, fed through a bounded queue,
+so it overlaps with whatever produces the frames.
+
+Writers:
+- GIFWriter:        every frame gets its own adaptive palette
+- PaletteGIFWriter: one global palette for all frames (frames are mapped through a precomputed
+                    color lookup table), only the rectangle that changed since the previous frame
+                    is written, with unchanged pixels in it left transparent
+
+Usage:
+
+with BackgroundWriter(GIFWriter("out.gif", duration=100)) as writer:
+    for frame in frames:
+        writer.write(frame)
+
+palette = get_global_palette(sample_frames)
+with PaletteGIFWriter("out.gif", palette, duration=100) as writer:
+    for frame in frames:
+        writer.write(frame)
+"""
+
+import queue
+import threading
+
+import numpy as np
+from PIL import GifImagePlugin
+from PIL import Image
+
+
+ENCODERS = ("adaptive", "global")
+
+# index 255 of the global palette is reserved for "unchanged since the previous frame"
+TRANSPARENT_INDEX = 255
+MAX_PALETTE_COLORS = 255
+
+# bits per channel of the color lookup table (2 ** (3 * LUT_BITS) entries)
+LUT_BITS = 6
+
+# palettes are computed from samples downscaled to at most this many px on the long side
+PALETTE_SAMPLE_SIZE = 256
+
+
+def _to_image(frame):
+    "frame (PIL image or array) -> RGB PIL image"
+    if not hasattr(frame, "convert"):
+        frame = Image.fromarray(np.asarray(frame, dtype=np.uint8))
+    return frame.convert("RGB")
+
+
+class GIFWriter:
+    """
+    writes an animated GIF one frame at a time
+    each frame gets its own (adaptive, 256 color) palette, the first frame's doubles as the global one
+    duration is per frame in milliseconds, loop=0 loops forever
+    """
+    def __init__(self, output, duration=100, loop=0):
+        self.output = output
+        self.duration = duration
+        self.loop = loop
+
+        self.size = None
+        self.num_frames = 0
+        self._fp = open(output, "wb")
+
+    def write(self, frame):
+        frame = _to_image(frame)
+        if self.size is None:
+            self.size = frame.size
+        elif frame.size != self.size:
+            raise ValueError("frame size %dx%d differs from the first frame's (%dx%d)" % (frame.size + self.size))
+
+        frame = frame.convert("P", palette=Image.Palette.ADAPTIVE)
+
+        if self.num_frames == 0:
+            header, _ = GifImagePlugin.getheader(frame, info={"loop": self.loop, "duration": self.duration})
+            self._fp.write(b"".join(header))
+            data = GifImagePlugin.getdata(frame, duration=self.duration)
+        else:
+            data = GifImagePlugin.getdata(frame, duration=self.duration, include_color_table=True)
+
+        self._fp.write(b"".join(data))
+        self.num_frames += 1
+
+    def close(self):
+        if self._fp.closed:
+            return
+        self._fp.write(b";")  # trailer
+        self._fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def get_global_palette(frames, colors=MAX_PALETTE_COLORS):
+    "a few sample frames (PIL images or arrays) -> (colors, 3) uint8 palette that covers all of them (median cut)"
+    samples = []
+    for frame in frames:
+        frame = _to_image(frame)
+        frame.thumbnail((PALETTE_SAMPLE_SIZE, PALETTE_SAMPLE_SIZE))
+        samples.append(np.asarray(frame))
+    if not samples:
+        raise ValueError("no frames to compute a palette from")
+
+    # one tall image, samples padded to the widest one with a color they already have
+    width = max(s.shape[1] for s in samples)
+    samples = [np.pad(s, ((0, 0), (0, width - s.shape[1]), (0, 0)), mode="edge") for s in samples]
+    montage = Image.fromarray(np.concatenate(samples))
+
+    quantized = montage.quantize(colors, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
+    num_colors = len(quantized.getcolors())
+    return np.array(quantized.getpalette()[:num_colors * 3], dtype=np.uint8).reshape(-1, 3)
+
+
+def build_color_lut(palette, bits=LUT_BITS, chunk_size=16384):
+    "palette (n, 3) -> uint8 lookup table of shape (2**bits,) * 3, mapping (r, g, b) >> (8 - bits) to the nearest palette index"
+    palette = np.asarray(palette, dtype=np.float32)
+    levels = 1 << bits
+
+    # center of each lut cell, in 0..255
+    centers = (np.arange(levels, dtype=np.float32) + 0.5) * (256 / levels)
+    grid = np.stack(np.meshgrid(centers, centers, centers, indexing="ij"), axis=-1).reshape(-1, 3)
+
+    # |cell - color|^2 = |cell|^2 - 2 cell.color + |color|^2, and |cell|^2 doesn't change the argmin
+    palette_norms = (palette ** 2).sum(axis=1)
+    lut = np.empty(len(grid), dtype=np.uint8)
+    for first in range(0, len(grid), chunk_size):
+        cells = grid[first:first + chunk_size]
+        distances = palette_norms - 2 * (cells @ palette.T)
+        lut[first:first + chunk_size] = distances.argmin(axis=1)
+
+    return lut.reshape(levels, levels, levels)
+
+
+def map_to_palette(frame, lut):
+    "RGB frame -> (h, w) uint8 palette indices"
+    rgb = np.asarray(_to_image(frame))
+    shift = 8 - int(round(np.log2(lut.shape[0])))
+    return lut[rgb[..., 0] >> shift, rgb[..., 1] >> shift, rgb[..., 2] >> shift]
+
+
+def get_changed_box(indices, previous):
+    "(left, top, right, bottom) of the pixels that differ between two index frames, None if none do"
+    changed = indices != previous
+    rows = np.flatnonzero(changed.any(axis=1))
+    if len(rows) == 0:
+        return None
+    cols = np.flatnonzero(changed.any(axis=0))
+    return cols[0], rows[0], cols[-1] + 1, rows[-1] + 1
+
+
+class PaletteGIFWriter:
+    """
+    writes an animated GIF one frame at a time, with a single global palette (at most 255 colors)
+    with delta=True, only the changed rectangle of each frame is written (unchanged pixels transparent),
+    which makes files of mostly static animations a lot smaller
+    duration is per frame in milliseconds, loop=0 loops forever
+    """
+    def __init__(self, output, palette, duration=100, loop=0, delta=True):
+        palette = np.asarray(palette, dtype=np.uint8).reshape(-1, 3)
+        if len(palette) > MAX_PALETTE_COLORS:
+            raise ValueError("palette has %d colors, at most %d are supported" % (len(palette), MAX_PALETTE_COLORS))
+
+        self.output = output
+        self.duration = duration
+        self.loop = loop
+        self.delta = delta
+
+        self.lut = build_color_lut(palette)
+        self._palette = np.zeros((256, 3), dtype=np.uint8)
+        self._palette[:len(palette)] = palette
+        self._palette = self._palette.ravel().tolist()
+
+        self.size = None
+        self.num_frames = 0
+        self._previous = None
+        self._fp = open(output, "wb")
+
+    def _to_image(self, indices):
+        image = Image.fromarray(indices)
+        image.putpalette(self._palette)
+        return image
+
+    def write(self, frame):
+        indices = map_to_palette(frame, self.lut)
+        size = indices.shape[::-1]
+        if self.size is None:
+            self.size = size
+        elif size != self.size:
+            raise ValueError("frame size %dx%d differs from the first frame's (%dx%d)" % (size + self.size))
+
+        params = {"duration": self.duration}
+        if self.num_frames == 0:
+            image = self._to_image(indices)
+            header, _ = GifImagePlugin.getheader(image, info={"loop": self.loop, "duration": self.duration})
+            self._fp.write(b"".join(header))
+            offset = (0, 0)
+        elif self.delta:
+            box = get_changed_box(indices, self._previous)
+            if box is None:
+                # nothing changed, a single transparent pixel keeps the timing
+                box = (0, 0, 1, 1)
+            left, top, right, bottom = box
+            delta = indices[top:bottom, left:right].copy()
+            delta[delta == self._previous[top:bottom, left:right]] = TRANSPARENT_INDEX
+            image = self._to_image(delta)
+            offset = (left, top)
+            params.update(transparency=TRANSPARENT_INDEX, disposal=1)  # 1: keep the previous frame underneath
+        else:
+            image = self._to_image(indices)
+            offset = (0, 0)
+
+        self._fp.write(b"".join(GifImagePlugin.getdata(image, offset, **params)))
+        self._previous = indices
+        self.num_frames += 1
+
+    def close(self):
+        if self._fp.closed:
+            return
+        self._fp.write(b";")  # trailer
+        self._fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class BackgroundWriter:
+    """
+    runs writer.write() in a thread, at most queue_size frames wait to be written
+    (write() blocks until there's room), errors in the thread are raised on the next write() / close()
+    """
+    def __init__(self, writer, queue_size=4, progress=True):
+        self.writer = writer
+        self.progress = progress
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            frame = self._queue.get()
+            if frame is None:
+                break
+            if self._error:
+                continue  # drain, so write() never blocks on a dead thread
+            try:
+                self.writer.write(frame)
+                if self.progress:
+                    print(".", end="", flush=True)
+            except Exception as e:
+                self._error = e
+
+    def _raise_error(self):
+        if self._error:
+            raise self._error
+
+    def write(self, frame):
+        self._raise_error()
+        self._queue.put(frame)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self.writer.close()
+        self._raise_error()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
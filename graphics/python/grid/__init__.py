@@ -0,0 +1,104 @@
+"""
+Grid dimension solver
+
+Finds (cols, rows) layouts for a grid of n items, ranked by a weighted cost:
+- aspect:       how far the grid's shape (rows / cols) is from the desired h/w ratio (log scale)
+- waste:        empty cells, as a fraction of n
+- distortion:   how much tiles of `tile_ratio` (h/w) get stretched when they're resized to fill the cells
+                of a canvas of `ratio` (collage tiles are stretched, not cropped): 1 - the smaller of the
+                tile's & the cell's h/w over the bigger one, only counted if tile_ratio is set
+
+Only layouts without spare rows / cols are considered (rows = ceil(n / cols) and vice versa),
+anything else just adds waste. All candidates are scored in a single numpy pass, so this stays
+fast for 100k+ items, and results are cached per arguments.
+
+Usage:
+
+cols, rows = get_best_dimensions(n, ratio)
+for layout in solve_dimensions(n, ratio, top=5):
+    print(layout.cols, layout.rows, layout.cost)
+"""
+
+import functools
+import math
+from collections import namedtuple
+
+import numpy as np
+
+
+COST_WEIGHTS = {"aspect": 1.0, "waste": 1.0, "distortion": 1.0}
+
+# candidates are searched up to this factor away from the ideal number of cols / rows
+SEARCH_FACTOR = 4
+
+Layout = namedtuple("Layout", ("cols", "rows", "cost", "aspect", "waste", "distortion"))
+
+
+def get_candidates(n, ratio=1):
+    "(cols, rows) arrays of all layouts of n items that have no spare rows / cols, around the desired ratio"
+    w = math.sqrt(n / ratio)
+    h = w * ratio
+
+    cols = np.arange(max(1, math.floor(w / SEARCH_FACTOR)), min(n, math.ceil(w * SEARCH_FACTOR)) + 1)
+    rows = np.arange(max(1, math.floor(h / SEARCH_FACTOR)), min(n, math.ceil(h * SEARCH_FACTOR)) + 1)
+
+    # by cols, and by rows (covers shapes the other side skips, e.g. when n is small)
+    candidates = np.concatenate((
+        np.stack((cols, -(-n // cols)), axis=1),
+        np.stack((-(-n // rows), rows), axis=1),
+    ))
+    candidates = np.unique(candidates, axis=0)
+
+    return candidates[:, 0], candidates[:, 1]
+
+
+def get_costs(n, cols, rows, ratio=1, tile_ratio=None):
+    "cost terms of each layout -> (aspect, waste, distortion) arrays"
+    cols = np.asarray(cols, dtype=np.float64)
+    rows = np.asarray(rows, dtype=np.float64)
+
+    aspect = np.abs(np.log((rows / cols) / ratio))
+    waste = (cols * rows - n) / n
+
+    if tile_ratio:
+        # h/w of each cell, for a canvas of the desired ratio
+        cell_ratio = ratio * cols / rows
+        distortion = 1 - np.minimum(cell_ratio, tile_ratio) / np.maximum(cell_ratio, tile_ratio)
+    else:
+        distortion = np.zeros_like(aspect)
+
+    return aspect, waste, distortion
+
+
+@functools.lru_cache(maxsize=256)
+def _solve_dimensions(n, ratio, tile_ratio, weights):
+    weights = dict(weights)
+    cols, rows = get_candidates(n, ratio)
+    aspect, waste, distortion = get_costs(n, cols, rows, ratio, tile_ratio)
+    cost = weights["aspect"] * aspect + weights["waste"] * waste + weights["distortion"] * distortion
+
+    # cheapest first, ties (up to float noise) go to the less wasteful, then narrower layout
+    order = np.lexsort((cols, waste, np.round(cost, 9)))
+    return tuple(Layout(int(cols[i]), int(rows[i]), float(cost[i]), float(aspect[i]), float(waste[i]), float(distortion[i]))
+            for i in order)
+
+
+def solve_dimensions(n, ratio=1, tile_ratio=None, weights=None, top=None):
+    """
+    grid layouts for n items, best first (at most `top` of them)
+    ratio is the desired h/w of the whole grid, tile_ratio the h/w of the tiles (if known),
+    weights override COST_WEIGHTS
+    """
+    if n < 1:
+        raise ValueError("need at least 1 item, got %d" % n)
+
+    weights = dict(COST_WEIGHTS, **(weights or {}))
+    layouts = _solve_dimensions(n, float(ratio), tile_ratio and float(tile_ratio), tuple(sorted(weights.items())))
+
+    return list(layouts[:top])
+
+
+def get_best_dimensions(n, ratio=1, tile_ratio=None, weights=None):
+    "determine (cols, rows) from num of cells & desired h/w ratio"
+    best = solve_dimensions(n, ratio, tile_ratio, weights, top=1)[0]
+    return best.cols, best.rows
@@ -1,78 +1,107 @@
 import argparse
-import random
+import os
 import re
 
 import matplotlib.pyplot as plt
 import numpy as np
+from PIL import Image
 
 # INFO: Color Maps: https://matplotlib.org/3.1.0/tutorials/colors/colormaps.html
 
 ## Data Arrangement ##
 
-def get_data_linear(n, *args, **kwargs):
-    data = np.array(range(n*n))
-    return data.reshape((n,n))
+SPIRAL_ROWS_PER_BAND = 256
 
-def get_data_squared(n, *args, **kwargs):
-    data = np.array([i**2 for i in range(n*n)])
-    return data.reshape((n,n))
+def get_data_linear(n, dtype=None, *args, **kwargs):
+    return np.arange(n*n, dtype=dtype).reshape((n,n))
 
-def get_data_transpose(n, *args, **kwargs):
-    data = np.arange(n*n).reshape((n,n))
+def get_data_squared(n, dtype=None, *args, **kwargs):
+    # computed in int64, then cast (integer dtypes have to fit the largest square, (n*n - 1) ** 2)
+    dtype = np.dtype(dtype or np.int64)
+    max_value = (n*n - 1) ** 2
+    if dtype.kind in "iu" and max_value > np.iinfo(dtype).max:
+        raise ValueError("%s is too narrow for squared data with n=%d (up to %d), use int64 or a float dtype" % (dtype, n, max_value))
+
+    data = np.arange(n*n, dtype=np.int64)
+    return (data * data).astype(dtype, copy=False).reshape((n,n))
+
+def get_data_transpose(n, dtype=None, *args, **kwargs):
+    data = np.arange(n*n, dtype=dtype).reshape((n,n))
     return np.transpose(data)
 
-def get_data_sin(n, *args, **kwargs):
-    return np.array([np.sin(i) for i in range(n*n)]).reshape((n,n))
-
-def get_data_sin_2(n, *args, **kwargs):
-    return np.array([np.sin(i/2) for i in range(n*n)]).reshape((n,n))
-
-def get_data_sin_3(n, *args, **kwargs):
-    return np.array([np.sin(i)/i for i in range(n*n)]).reshape((n,n))
-
-def get_data_sin_4(n, *args, **kwargs):
-    return np.array([np.sin(i)/20 for i in range(n*n)]).reshape((n,n))
-
-def get_data_square_spiral(n, bug=False, *args, **kwargs):
-    data = [[0 for i in range(n)] for j in range(n)]
-    cur_val = 0
-
-    for k in range(n//2):
-        i = k
-        # -> across
-        for j in range(k, n - k):
-            data[i][j] = cur_val
-            cur_val += 1
-        # down
-        for i in range(k + 1, n - 1 - k):
-            data[i][j] = cur_val
-            cur_val += 1
-        # <- back
-        i += 1
-        for j in range(n - 1 - k, k - 1, -1):
-            data[i][j] = cur_val
-            cur_val += 1
-        # up
-        for i in range(n - 2 - k, k, -1):
-            data[i][j] = cur_val
-            cur_val += 1
-
-    if n % 2 == 1:
-        if not bug:
-            j += 1
-            data[i][j] = cur_val
-        else:
-            data[2 * k + 1][2 * k + 1] = cur_val 
-
-    return np.array(data)
-
-def get_data_comprehensive_random(n, *args, **kwargs):
-    data = list(range(n*n))
-    random.shuffle(data)
-    return np.array(data).reshape((n,n))
-
-def get_data_random(n, *args, **kwargs):
-    return np.random.random((n,n))
+def _check_float_dtype(mode, dtype):
+    # fractional values cast to integers would come out (nearly) all zeros, a blank mosaic
+    if dtype and np.dtype(dtype).kind != "f":
+        raise ValueError("%s data is fractional, use a float dtype rather than %s" % (mode, np.dtype(dtype)))
+
+def _get_data_sin(n, dtype=None, scale=1, divide_by_index=False, divide_by=1):
+    _check_float_dtype("sin", dtype)
+
+    # computed in float64 (indices above 2**24 aren't exact in float32), then cast
+    i = np.arange(n*n, dtype=np.float64)
+    data = np.sin(i / scale) if scale != 1 else np.sin(i)
+    if divide_by_index:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            data /= i
+    elif divide_by != 1:
+        data /= divide_by
+    return data.astype(dtype or np.float64, copy=False).reshape((n,n))
+
+def get_data_sin(n, dtype=None, *args, **kwargs):
+    return _get_data_sin(n, dtype)
+
+def get_data_sin_2(n, dtype=None, *args, **kwargs):
+    return _get_data_sin(n, dtype, scale=2)
+
+def get_data_sin_3(n, dtype=None, *args, **kwargs):
+    return _get_data_sin(n, dtype, divide_by_index=True)
+
+def get_data_sin_4(n, dtype=None, *args, **kwargs):
+    return _get_data_sin(n, dtype, divide_by=20)
+
+def get_data_square_spiral(n, bug=False, dtype=None, *args, **kwargs):
+    """
+    clockwise spiral from the top left corner inwards, in closed form:
+    ring k (distance from the edge) starts at value 4k(n-k) and each of its sides spans n-1-2k steps,
+    so a cell's value is the ring's start plus its offset along the ring (top, right, bottom, left)
+    """
+    data = np.empty((n, n), dtype=dtype or np.int64)
+    j = np.arange(n)[np.newaxis, :]
+
+    # a band of rows at a time, to keep the temporaries small for big n
+    for row in range(0, n, SPIRAL_ROWS_PER_BAND):
+        row_end = min(row + SPIRAL_ROWS_PER_BAND, n)
+        i = np.arange(row, row_end)[:, np.newaxis]
+
+        k = np.minimum(np.minimum(i, j), np.minimum(n - 1 - i, n - 1 - j))
+        side = n - 1 - 2 * k
+        start = 4 * k * (n - k)
+
+        top = (i == k)
+        right = ~top & (j == n - 1 - k)
+        bottom = ~top & ~right & (i == n - 1 - k)
+
+        offset = np.where(top, j - k,
+                 np.where(right, side + (i - k),
+                 np.where(bottom, 2 * side + (n - 1 - k - j),
+                          3 * side + (n - 1 - k - i))))
+
+        data[row:row_end] = start + offset
+
+    if n % 2 == 1 and bug and n > 1:
+        # the original loop left the center cell empty and wrote the last value to (n-2, n-2) instead
+        data[n // 2][n // 2] = 0
+        data[n - 2][n - 2] = n*n - 1
+
+    return data
+
+def get_data_comprehensive_random(n, dtype=None, *args, **kwargs):
+    return np.random.permutation(np.arange(n*n, dtype=dtype)).reshape((n,n))
+
+def get_data_random(n, dtype=None, *args, **kwargs):
+    _check_float_dtype("random", dtype)
+    data = np.random.random((n,n))
+    return data.astype(dtype, copy=False) if dtype else data
 
 DATA_MODES = {
     "linear":                   get_data_linear,
@@ -98,7 +127,32 @@ def get_data(mode, n, *args, **kwargs):
 
 ## IN / OUT
 
-def save_figure(data, output, cmap, size, dpi, interpolation):
+RENDERERS = ("auto", "numpy", "matplotlib")
+
+DTYPES = ("int32", "int64", "uint32", "float32", "float64")
+
+# imshow's interpolation methods
+INTERPOLATIONS = ('none', 'antialiased', 'nearest', 'bilinear', 'bicubic', 'spline16', 'spline36', 'hanning', 'hamming', 'hermite',
+        'kaiser', 'quadric', 'catrom', 'gaussian', 'bessel', 'mitchell', 'sinc', 'lanczos')
+
+# with these, imshow just maps every cell to a block of pixels, which the numpy renderer does directly
+NUMPY_INTERPOLATIONS = ("nearest", "none")
+NUMPY_FORMATS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".webp")
+
+def get_renderer(renderer, output, interpolation):
+    if renderer != "auto":
+        return renderer
+
+    ext = os.path.splitext(output)[1].lower()
+    if interpolation in NUMPY_INTERPOLATIONS and ext in NUMPY_FORMATS:
+        return "numpy"
+    return "matplotlib"
+
+def save_figure(data, output, cmap, size, dpi, interpolation, renderer="auto"):
+    if get_renderer(renderer, output, interpolation) == "numpy":
+        render_image(data, cmap, size, dpi).save(output)
+        return
+
     img = plt.imshow(data, interpolation=interpolation)
     img.set_cmap(cmap)
     plt.axis('off')
@@ -106,6 +160,75 @@ def save_figure(data, output, cmap, size, dpi, interpolation):
     fig.set_size_inches(*size)
     fig.set_dpi(dpi)
     fig.savefig(output, bbox_inches='tight')
+    plt.close(fig)
+
+def get_colormap_lut(cmap):
+    "colormap -> (uint8 RGB lookup table with one row per color, RGB of 'bad' (NaN) values)"
+    colormap = plt.get_cmap(cmap)
+    lut = colormap(np.arange(colormap.N))[:, :3]
+    bad = colormap.get_bad()
+
+    # NaNs are transparent by default, which is the white figure background in matplotlib's output
+    bad = bad[:3] * bad[3] + (1 - bad[3])
+
+    return (lut * 255 + 0.5).astype(np.uint8), (np.array(bad) * 255 + 0.5).astype(np.uint8)
+
+def get_value_range(data):
+    "(min, max) of the data, NaNs ignored (through data.value_range(), for grids that aren't plain arrays)"
+    if hasattr(data, "value_range"):
+        return data.value_range()
+    return np.nanmin(data), np.nanmax(data)
+
+def get_sample_indices(num_cells, num_pixels):
+    "nearest neighbour: which cell each output pixel comes from"
+    return (np.arange(num_pixels) * num_cells) // num_pixels
+
+def render_image(data, cmap, size, dpi):
+    """
+    renders the matrix the way imshow(interpolation='nearest') does, without going through a figure:
+    every cell becomes a block of pixels (integer sized when upscaling) colored through a lookup table
+    the image is fit into size (inches) * dpi, keeping the aspect ratio of the matrix
+    """
+    rows, cols = data.shape
+    width, height = size[0] * dpi, size[1] * dpi
+
+    scale = min(width / cols, height / rows)
+    if scale >= 1:
+        scale = int(scale)
+    out_width, out_height = max(1, round(cols * scale)), max(1, round(rows * scale))
+
+    # sample the data at output resolution first, so nothing bigger than the output is ever allocated
+    vmin, vmax = get_value_range(data)
+    sampled = data[get_sample_indices(rows, out_height)[:, np.newaxis], get_sample_indices(cols, out_width)]
+
+    lut, bad = get_colormap_lut(cmap)
+    n = len(lut)
+
+    # same normalization & binning as matplotlib's Normalize + Colormap
+    with np.errstate(divide='ignore', invalid='ignore'):
+        normalized = (sampled.astype(np.float64) - vmin) / (vmax - vmin) if vmax > vmin else np.zeros(sampled.shape)
+    nan = np.isnan(normalized)
+    indices = np.clip(np.nan_to_num(normalized * n), 0, n - 1).astype(np.intp)
+
+    pixels = lut[indices]
+    pixels[nan] = bad
+
+    return Image.fromarray(pixels, "RGB")
+
+def get_tech_spec_name(mode, n, size, dpi, cmap, interpolation, bug=False):
+    return "-".join(filter(None,(
+        mode,
+        "%d" % n,
+        "%dx%dinch" % tuple(size),
+        "%ddpi" % dpi,
+        cmap,
+        interpolation,
+        "bug" if bug else ""
+    )))
+
+def add_tech_spec_name(output, tech_spec_name):
+    filename, ext = os.path.splitext(output)
+    return "%s-%s%s" % (filename, tech_spec_name, ext)
 
 def size_str(arg_value, pat=re.compile(r"^(\d+)x(\d+)$")):
     match = pat.match(arg_value)
@@ -119,11 +242,14 @@ def get_parser():
     parser.add_argument("mode", help="data arrangement pattern", type=str, choices=get_data_modes())
     parser.add_argument("n", help="size of matrix (n x n)", type=int)
     parser.add_argument("output", help="output file (PNG)", type=str)
-    parser.add_argument("--cmap", "-c", help="set color map", type=str, choices=plt.cm._cmap_registry.keys(), default="viridis")
+    parser.add_argument("--cmap", "-c", help="set color map", type=str, choices=plt.colormaps(), default="viridis")
     parser.add_argument("--dpi", "-d", help="set dots (pixels) per inch", type=int, default=100)
     parser.add_argument("--size", "-s", help="set size in inches", type=size_str, default="30x30")
-    parser.add_argument("--interpolation", "-i", help="set interpolation method", type=str, default='nearest', choices=('none', 'antialiased', 'nearest', 'bilinear',
-            'bicubic', 'spline16', 'spline36', 'hanning', 'hamming', 'hermite', 'kaiser', 'quadric', 'catrom', 'gaussian', 'bessel', 'mitchell', 'sinc', 'lanczos'))
+    parser.add_argument("--interpolation", "-i", help="set interpolation method", type=str, default='nearest', choices=INTERPOLATIONS)
+    parser.add_argument("--renderer", "-r", help="numpy renders PNGs directly (nearest/none interpolation only),\n"
+            "matplotlib supports every interpolation & output format, auto picks numpy when possible", type=str, default="auto", choices=RENDERERS)
+    parser.add_argument("--dtype", help="numpy dtype of the data matrix (default: per mode, int64 or float64)", type=str, default=None,
+            choices=DTYPES)
     parser.add_argument("--tech-spec-name", "-t", help="append run parameters to output name", dest='tsn', action='store_true')
 
     return parser
@@ -0,0 +1,193 @@
+"""
+Translation-only frame stabilization (phase correlation)
+
+Shifts are estimated in two steps:
+- coarse:   on a downscaled copy of the whole frame (at most COARSE_SIZE px on the long side)
+- refine:   at full resolution, on a REFINE_SIZE px crop around the center, taken from where the
+            coarse estimate says the reference's center ended up (so only a small residual is left)
+
+Everything is float32, and the reference's spectra (both levels) are computed once per reference.
+
+Shifts follow cv2.phaseCorrelate(reference, frame): (dx, dy) is how far the frame's content moved
+relative to the reference, so warping the frame by (-dx, -dy) lines it up with the reference.
+
+Usage:
+
+estimator = ShiftEstimator(reference)
+dx, dy = estimator.estimate(frame)
+"""
+
+import json
+import os
+
+import cv2
+import numpy as np
+
+
+COARSE_SIZE = 512
+REFINE_SIZE = 256
+
+SHIFT_CACHE_NAME = ".giffer-shifts.json"
+
+
+def to_gray(image):
+    "PIL image / RGB array / gray array -> float32 gray array"
+    arr = np.asarray(image)
+    if arr.ndim == 3:
+        arr = cv2.cvtColor(arr[..., :3], cv2.COLOR_RGB2GRAY)
+    return arr.astype(np.float32)
+
+
+def get_spectrum(gray, window):
+    return cv2.dft(gray * window, flags=cv2.DFT_COMPLEX_OUTPUT)
+
+
+def correlate_spectra(ref_spectrum, spectrum):
+    """
+    phase correlation of two spectra -> (dx, dy, response), same as cv2.phaseCorrelate
+    (peak location refined with a 5x5 weighted centroid)
+    """
+    cross = cv2.mulSpectrums(ref_spectrum, spectrum, 0, conjB=True)
+    magnitude = cv2.magnitude(cross[..., 0], cross[..., 1])
+    cross /= (magnitude + np.finfo(np.float32).eps)[..., np.newaxis]
+
+    corr = cv2.idft(cross, flags=cv2.DFT_REAL_OUTPUT | cv2.DFT_SCALE)
+    h, w = corr.shape
+
+    # peak, with the surface wrapped around so shifts are centered on 0
+    py, px = np.unravel_index(np.argmax(corr), corr.shape)
+    ys = (py + np.arange(-2, 3)) % h
+    xs = (px + np.arange(-2, 3)) % w
+    patch = corr[np.ix_(ys, xs)]
+    total = patch.sum()
+    response = float(total)
+    if total > 0:
+        offsets = np.arange(-2, 3, dtype=np.float64)
+        py = py + (patch.sum(axis=1) * offsets).sum() / total
+        px = px + (patch.sum(axis=0) * offsets).sum() / total
+
+    dy = py - h if py > h / 2 else py
+    dx = px - w if px > w / 2 else px
+
+    # cv2.phaseCorrelate(reference, frame) convention
+    return -dx, -dy, response
+
+
+def get_center_crop_box(shape, size, offset=(0, 0)):
+    "(x, y, w, h) of a (size x size) box (or smaller, for small frames) around the center, offset by (dx, dy), kept inside shape"
+    h, w = shape[:2]
+    cw, ch = min(size, w), min(size, h)
+    x = int(round((w - cw) / 2 + offset[0]))
+    y = int(round((h - ch) / 2 + offset[1]))
+    x = min(max(x, 0), w - cw)
+    y = min(max(y, 0), h - ch)
+    return x, y, cw, ch
+
+
+class ShiftEstimator:
+    """
+    estimates how far frames moved relative to a reference frame (see module docs)
+    frames must be the same size as the reference
+    """
+    def __init__(self, reference, coarse_size=COARSE_SIZE, refine_size=REFINE_SIZE):
+        gray = to_gray(reference)
+        self.shape = gray.shape
+        self.refine_size = refine_size
+
+        h, w = self.shape
+        self.scale = max(1, int(np.ceil(max(h, w) / coarse_size)))
+        self.coarse_shape = (max(1, h // self.scale), max(1, w // self.scale))
+        self.coarse_window = cv2.createHanningWindow(self.coarse_shape[::-1], cv2.CV_32F)
+        self.coarse_spectrum = get_spectrum(self._downscale(gray), self.coarse_window)
+
+        self.ref_box = get_center_crop_box(self.shape, refine_size)
+        x, y, cw, ch = self.ref_box
+        self.refine_window = cv2.createHanningWindow((cw, ch), cv2.CV_32F)
+        self.refine_spectrum = get_spectrum(gray[y:y+ch, x:x+cw], self.refine_window)
+
+    def _downscale(self, gray):
+        if self.scale == 1:
+            return gray
+        return cv2.resize(gray, self.coarse_shape[::-1], interpolation=cv2.INTER_AREA)
+
+    def estimate(self, frame):
+        "frame -> (dx, dy) of its content relative to the reference, in px"
+        gray = to_gray(frame)
+        if gray.shape != self.shape:
+            raise ValueError("frame size %s differs from the reference's (%s)" % (gray.shape[::-1], self.shape[::-1]))
+
+        dx, dy, _ = correlate_spectra(self.coarse_spectrum, get_spectrum(self._downscale(gray), self.coarse_window))
+        if self.scale == 1 and self.coarse_shape == self.ref_box[2:][::-1]:
+            return dx, dy
+
+        # the reference's crop shows up in the frame around (its position + coarse shift)
+        x, y, cw, ch = get_center_crop_box(self.shape, self.refine_size, (dx * self.scale, dy * self.scale))
+        rdx, rdy, _ = correlate_spectra(self.refine_spectrum, get_spectrum(gray[y:y+ch, x:x+cw], self.refine_window))
+
+        return x - self.ref_box[0] + rdx, y - self.ref_box[1] + rdy
+
+
+def get_crop_margin(shifts, pad=5):
+    "crop margin that keeps only the area common to all shifted frames"
+    max_shift = max(max(abs(dx), abs(dy)) for dx, dy in shifts)
+    return int(max_shift) + pad
+
+
+def stabilize_frame(frame, shift, crop_margin):
+    "frame (array) -> frame moved back in line with the reference, then cropped by crop_margin on each side"
+    arr = np.asarray(frame)
+    h, w = arr.shape[:2]
+    dx, dy = shift
+
+    matrix = np.float32([[1, 0, -dx], [0, 1, -dy]])
+    shifted = cv2.warpAffine(arr, matrix, (w, h))
+    return shifted[crop_margin:h-crop_margin, crop_margin:w-crop_margin]
+
+
+class ShiftCache:
+    """
+    shifts relative to a reference file, kept in a json sidecar (SHIFT_CACHE_NAME in the reference's folder)
+    entries are keyed by file & mtime (reference's and frame's), shifts are stored as fractions of the
+    frame size, so they stay valid when frames are resized
+    """
+    def __init__(self, reference):
+        self.reference = os.path.realpath(reference)
+        self.path = os.path.join(os.path.dirname(self.reference), SHIFT_CACHE_NAME)
+        self._key = "%s:%s" % (self.reference, os.stat(self.reference).st_mtime_ns)
+
+        self._data = {}
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path) as f:
+                    self._data = json.load(f)
+            except (OSError, ValueError):
+                self._data = {}  # unreadable sidecar, start over
+
+        # entries for older versions of the reference are stale
+        self._data = {k: v for k, v in self._data.items() if not k.startswith(self.reference + ":") or k == self._key}
+        self._entries = self._data.setdefault(self._key, {})
+        self._dirty = False
+
+    def get(self, filename, size):
+        "cached (dx, dy) in px for a frame of size (w, h), or None"
+        entry = self._entries.get(os.path.realpath(filename))
+        if not entry or entry["mtime"] != os.stat(filename).st_mtime_ns:
+            return None
+        fx, fy = entry["shift"]
+        return fx * size[0], fy * size[1]
+
+    def put(self, filename, size, shift):
+        self._entries[os.path.realpath(filename)] = {
+            "mtime": os.stat(filename).st_mtime_ns,
+            "shift": [shift[0] / size[0], shift[1] / size[1]],
+        }
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._data, f)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the packages (and the scripts' own imports) are found relative to graphics/python, like the scripts' sys.path trick does
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), ".."))
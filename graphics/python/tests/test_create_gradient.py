@@ -0,0 +1,45 @@
+import importlib.util
+import os
+
+import numpy as np
+import pytest
+
+
+SCRIPT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "chatgpt", "single_create_gradient_from_source_image.py")
+
+
+@pytest.fixture(scope="module")
+def script():
+    spec = importlib.util.spec_from_file_location("single_create_gradient_from_source_image", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def legacy_create_gradient(colors, output_dimensions):
+    "the original np.vectorize / repeat / rot90 version (minus the shuffle)"
+    indices = np.linspace(0, 1, len(colors))
+    gradient_func = lambda x: np.array([np.interp(x, indices, colors[:, i]) for i in range(3)])
+    gradient_func = np.vectorize(gradient_func, signature='()->(n)')
+    gradient = gradient_func(np.linspace(0, 1, output_dimensions[1])).astype(int)
+    gradient = np.repeat(gradient[np.newaxis, :], output_dimensions[0], axis=0)
+    return np.rot90(gradient)
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_create_gradient_matches_legacy(script, seed):
+    rng = np.random.default_rng(seed)
+    num_colors = int(rng.integers(2, 8))
+    dimensions = (int(rng.integers(1, 64)), int(rng.integers(2, 400)))
+    if seed % 2:
+        colors = rng.integers(0, 256, (num_colors, 3)).astype(np.float64)  # integer stops, like median-cut's
+    else:
+        colors = rng.uniform(0, 255, (num_colors, 3))
+
+    np.random.seed(seed)
+    gradient = script.create_gradient(colors, dimensions)  # shuffles colors in place
+
+    expected = legacy_create_gradient(colors, dimensions)
+    assert gradient.shape == expected.shape
+    assert gradient.dtype == np.uint8
+    np.testing.assert_array_equal(gradient, expected)
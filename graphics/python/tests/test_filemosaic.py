@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+import filemosaic
+from filemosaic import sliding_entropy
+
+
+def naive_entropy(window):
+    counts = np.bincount(window, minlength=256)
+    p = counts[counts > 0] / len(window)
+    return -(p * np.log2(p)).sum()
+
+
+def naive_sliding_entropy(data, window, step):
+    num_steps = -(-len(data) // step)
+    num_windows = max(1, num_steps - window // step + 1)
+    return np.array([naive_entropy(data[i * step:i * step + window]) for i in range(num_windows)])
+
+
+def test_sliding_entropy_short_file():
+    data = np.array([0] * 64 + [1] * 36, dtype=np.uint8)
+    entropy = sliding_entropy(data, window=256, step=64)
+    assert len(entropy) == 1
+    assert entropy[0] == pytest.approx(naive_entropy(data), abs=1e-5)
+    assert entropy[0] <= 1
+
+
+@pytest.mark.parametrize("size", [1, 5, 63, 64, 100, 255, 256, 257, 1000, 4096, 10001])
+@pytest.mark.parametrize("window, step", [(256, 256), (256, 64), (256, 16), (64, 1), (512, 128)])
+def test_sliding_entropy_matches_naive(size, window, step):
+    data = np.random.default_rng(size).integers(0, 256, size).astype(np.uint8)
+    data[:size // 3] = 7  # a low entropy stretch
+    np.testing.assert_allclose(sliding_entropy(data, window, step), naive_sliding_entropy(data, window, step), atol=1e-4)
+
+
+def test_sliding_entropy_across_chunks(monkeypatch):
+    # tiny chunks, so windows span chunk boundaries
+    monkeypatch.setattr(filemosaic, "CHUNK_BYTES", 1024)
+    data = np.random.default_rng(0).integers(0, 40, 20000).astype(np.uint8)
+    np.testing.assert_allclose(sliding_entropy(data, 256, 32), naive_sliding_entropy(data, 256, 32), atol=1e-4)
+
+
+@pytest.mark.parametrize("dtype", [np.uint8, np.float32])
+def test_padded_grid_renders_like_a_zero_padded_array(dtype):
+    from mosaic import render_image
+
+    values = (np.arange(1000) % 200 + 20).astype(dtype)
+    grid = filemosaic.to_grid(values, 30, 40)
+    padded = np.zeros(30 * 40, dtype=dtype)
+    padded[:len(values)] = values
+    padded = padded.reshape(30, 40)
+
+    np.testing.assert_array_equal(np.asarray(grid), padded)
+    for size in [(1, 1), (3, 2), (10, 10)]:
+        np.testing.assert_array_equal(np.asarray(render_image(grid, "viridis", size, 50)),
+                                      np.asarray(render_image(padded, "viridis", size, 50)))
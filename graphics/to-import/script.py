@@ -1,20 +1,37 @@
 #!/usr/local/opt/python@3.8/bin/python3.8
 
+import argparse
+import functools
 import glob
+import os
 import random
+import sys
 
-from PIL import Image, ImageEnhance
+from PIL import Image
 import numpy as np
 import colorsys
 
+# trick for making local package imports work
+sys.path.append(os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), "..", "python"))
+
+import colorops
+from common import THUMBNAIL_CACHE_DIR
+from common import ThumbnailCache
+from common import load_thumbnail
+from common import parallel_map
+
 
 THUMBNAIL_SIZE = (80, 80)
+COLORIZE_SATURATION = 4
 COLLAGE_SIZE = (34, 33)
 
 MALE_PIC = "pics/male.jpg"
 FEMALE_PIC = "pics/female.jpg"
 FRIENDS_PIC = "pics/1121 friends.png"
 
+KILOGROUPS_FOLDER = "script-output/kilogroups-framed-34x33"
+KILOGROUPS_RANGE = (52, 10098)
+
 
 """
 rgb_to_hsv = np.vectorize(colorsys.rgb_to_hsv)
@@ -29,68 +46,6 @@ def shift_hue(arr, hout):
     return arr
 """
 
-def rgb_to_hsv(rgb):
-    # Translated from source of colorsys.rgb_to_hsv
-    # r,g,b should be a numpy arrays with values between 0 and 255
-    # rgb_to_hsv returns an array of floats between 0.0 and 1.0.
-    rgb = rgb.astype('float')
-    hsv = np.zeros_like(rgb)
-    # in case an RGBA array was passed, just copy the A channel
-    hsv[..., 3:] = rgb[..., 3:]
-    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
-    maxc = np.max(rgb[..., :3], axis=-1)
-    minc = np.min(rgb[..., :3], axis=-1)
-    hsv[..., 2] = maxc
-    mask = maxc != minc
-    hsv[mask, 1] = (maxc - minc)[mask] / maxc[mask]
-    rc = np.zeros_like(r)
-    gc = np.zeros_like(g)
-    bc = np.zeros_like(b)
-    rc[mask] = (maxc - r)[mask] / (maxc - minc)[mask]
-    gc[mask] = (maxc - g)[mask] / (maxc - minc)[mask]
-    bc[mask] = (maxc - b)[mask] / (maxc - minc)[mask]
-    hsv[..., 0] = np.select(
-        [r == maxc, g == maxc], [bc - gc, 2.0 + rc - bc], default=4.0 + gc - rc)
-    hsv[..., 0] = (hsv[..., 0] / 6.0) % 1.0
-    return hsv
-
-def hsv_to_rgb(hsv):
-    # Translated from source of colorsys.hsv_to_rgb
-    # h,s should be a numpy arrays with values between 0.0 and 1.0
-    # v should be a numpy array with values between 0.0 and 255.0
-    # hsv_to_rgb returns an array of uints between 0 and 255.
-    rgb = np.empty_like(hsv)
-    rgb[..., 3:] = hsv[..., 3:]
-    h, s, v = hsv[..., 0], hsv[..., 1], hsv[..., 2]
-    i = (h * 6.0).astype('uint8')
-    f = (h * 6.0) - i
-    p = v * (1.0 - s)
-    q = v * (1.0 - s * f)
-    t = v * (1.0 - s * (1.0 - f))
-    i = i % 6
-    conditions = [s == 0.0, i == 1, i == 2, i == 3, i == 4, i == 5]
-    rgb[..., 0] = np.select(conditions, [v, q, p, p, t, v], default=v)
-    rgb[..., 1] = np.select(conditions, [v, v, v, q, p, p], default=t)
-    rgb[..., 2] = np.select(conditions, [v, p, t, v, v, q], default=p)
-    return rgb.astype('uint8')
-
-def shift_hue(arr,hout):
-    hsv=rgb_to_hsv(arr)
-    hsv[...,0]=hout
-    rgb=hsv_to_rgb(hsv)
-    return rgb
-
-def colorize(image, hue):
-    """
-    Colorize PIL image `original` with the given
-    `hue` (hue within 0-360); returns another PIL image.
-    """
-    img = image.convert('RGBA')
-    arr = np.array(np.asarray(img).astype('float'))
-    new_img = Image.fromarray(shift_hue(arr, hue/360.).astype('uint8'), 'RGBA')
-
-    return new_img
-
 def add_frame(image, w, h, background_color=(255,255,255,255)):
     iw, ih = image.size
     nw = iw + 2*w
@@ -100,7 +55,29 @@ def add_frame(image, w, h, background_color=(255,255,255,255)):
     return new_image
 
 
-def create_collage(paths, cols, rows, output, pls_colorize=False, pls_add_frame=False):
+def load_tile_pool(paths, cache=None):
+    "decodes & resizes each distinct path once (through cache, a ThumbnailCache, if given); returns { path: thumbnail }"
+    pool = {}
+    for path in paths:
+        if path not in pool:
+            pool[path] = load_thumbnail(path, THUMBNAIL_SIZE, cache=cache)
+    return pool
+
+def colorize_tiles(paths, pool):
+    """
+    colorizes every tile with a random hue (and boosted saturation)
+    HSV planes are computed once per distinct source, and all tiles are recolored in one batch
+    """
+    sources = {path: i for i, path in enumerate(pool)}
+
+    hsv = np.stack([colorops.to_hsv(np.asarray(image.convert('RGB'))) for image in pool.values()])
+    hues = np.array([random.randint(0, 360) for path in paths]) / 360.
+
+    tiles = colorops.colorize_batch(hsv, hues, [sources[path] for path in paths], saturation=COLORIZE_SATURATION)
+    return (Image.fromarray(tile, 'RGB') for tile in tiles)
+
+
+def create_collage(paths, cols, rows, output, pls_colorize=False, pls_add_frame=False, cache=None):
     #w, h = Image.open(paths[0]).size
     w, h = THUMBNAIL_SIZE
 
@@ -109,17 +86,17 @@ def create_collage(paths, cols, rows, output, pls_colorize=False, pls_add_frame=
 
     new_image = Image.new('RGB', (collage_width, collage_height))
 
-    cursor = (0,0)
-    for path in paths:
-        # place image
-        image = Image.open(path)
-        image = image.resize(THUMBNAIL_SIZE)
+    # sources repeat a lot (kilogroups are made of 2 pictures), so each is only decoded once
+    pool = load_tile_pool(paths, cache)
 
-        if pls_colorize:
-            image = colorize(image, random.randint(0, 360))
-            converter = ImageEnhance.Color(image)
-            image = converter.enhance(4)
+    if pls_colorize:
+        images = colorize_tiles(paths, pool)
+    else:
+        images = (pool[path] for path in paths)
 
+    cursor = (0,0)
+    for image in images:
+        # place image
         new_image.paste(image, cursor)
 
         # move cursor
@@ -155,25 +132,49 @@ def get_kilo_strangers(cols, rows):
     return pics
 
 
-def generate_kilogroups(cols, rows):
-    for i in range(52, 10098):
-        output = "script-output/kilogroups-framed-34x33/%d.png" % i
-        create_collage(get_kilo_strangers(cols, rows), cols, rows, output, pls_colorize=True, pls_add_frame=True)
-        print(".", sep="", end="", flush=True)
+def get_kilogroup_output(i):
+    return os.path.join(KILOGROUPS_FOLDER, "%d.png" % i)
+
+def make_kilogroup(i, cols, rows, cache=None):
+    # seeded by index, so every kilogroup is reproducible no matter which worker (or which run) makes it
+    random.seed(i)
+
+    # written under a temp name first, so an interrupted run never leaves a half-written output behind
+    output = get_kilogroup_output(i)
+    create_collage(get_kilo_strangers(cols, rows), cols, rows, output + ".tmp", pls_colorize=True, pls_add_frame=True, cache=cache)
+    os.replace(output + ".tmp", output)
+    return i
+
+def generate_kilogroups(cols, rows, start=KILOGROUPS_RANGE[0], stop=KILOGROUPS_RANGE[1], workers=None, cache=None):
+    """
+    makes kilogroups start..stop-1 across a pool of worker processes
+    existing outputs are skipped, so an interrupted run can just be started again
+    completed indices are appended to manifest.txt in the output folder
+    """
+    os.makedirs(KILOGROUPS_FOLDER, exist_ok=True)
+
+    todo = [i for i in range(start, stop) if not os.path.exists(get_kilogroup_output(i))]
+    print("%d of %d kilogroups left" % (len(todo), stop - start))
+
+    with open(os.path.join(KILOGROUPS_FOLDER, "manifest.txt"), "a") as manifest:
+        for i in parallel_map(functools.partial(make_kilogroup, cols=cols, rows=rows, cache=cache), todo, workers):
+            manifest.write("%d\n" % i)
+            manifest.flush()
+            print(".", sep="", end="", flush=True)
 
     print("\ndone")
 
-def generate_megagroups(cols, rows):
+def generate_megagroups(cols, rows, cache=None):
     for i in range(8):
         output = "script-output/megagroups/%d.png" % i
-        create_collage(get_mega_group(cols, rows, add_friends=False), cols, rows, output, pls_colorize=False)
+        create_collage(get_mega_group(cols, rows, add_friends=False), cols, rows, output, pls_colorize=False, cache=cache)
         print(".", sep="", end="", flush=True)
 
     print("\ndone")
 
-def generate_megagroup_with_friends(cols, rows):
+def generate_megagroup_with_friends(cols, rows, cache=None):
     output = "script-output/megagroups/mega-with-friends.png"
-    create_collage(get_mega_group(cols, rows, add_friends=True), cols, rows, output, pls_colorize=False)
+    create_collage(get_mega_group(cols, rows, add_friends=True), cols, rows, output, pls_colorize=False, cache=cache)
 
 def frame_friends():
     image = Image.open("pics/1121 friends.png")
@@ -183,9 +184,19 @@ def frame_friends():
 
 
 def main():
+    parser = argparse.ArgumentParser(description="generate the kilogroups series")
+    parser.add_argument("--start", type=int, default=KILOGROUPS_RANGE[0], help="first kilogroup index")
+    parser.add_argument("--stop", type=int, default=KILOGROUPS_RANGE[1], help="last kilogroup index (exclusive)")
+    parser.add_argument("-w", "--workers", type=int, default=0, help="number of worker processes (0 = all cores)")
+    parser.add_argument("-tc", "--thumbnail-cache", type=str, default=THUMBNAIL_CACHE_DIR, help="folder for caching resized tiles between runs")
+    parser.add_argument("-ntc", "--no-thumbnail-cache", action="store_false", dest="use_thumbnail_cache", help="don't cache resized tiles")
+    args = parser.parse_args()
+
+    cache = ThumbnailCache(args.thumbnail_cache) if args.use_thumbnail_cache else None
+
     cols, rows = COLLAGE_SIZE
     #frame_friends()
-    generate_kilogroups(cols, rows)
+    generate_kilogroups(cols, rows, args.start, args.stop, args.workers or None, cache)
 
 
 